@@ -1,14 +1,72 @@
-from quart import Quart, request, render_template, redirect, url_for, jsonify, request
-from youtube_search import search_youtube, viz_combined, analyze_comments, sentiment_viz
-import pandas as pd
+from quart import Quart, Response, request, redirect, url_for, jsonify, g
+from quart import render_template as quart_render_template
+from youtube_search import search_youtube, start_search, viz_combined, sentiment_viz, chart_series, sentiment_series, cap_results, cap_comments, SEARCH_MAX_RESULTS, COMMENTS_MAX_PER_VIDEO
+from normalize import link_titles, to_records
+from sentiment_client import analyze_comments, analyze_many
 import asyncio
-import shelve
+import base64
+import json
+import time
 from urllib.parse import urlparse, parse_qs
-from video_search import process_video, generate_wordcloud
+from video_search import process_video, wordcloud_job, generate_wordcloud, VIDEO_COMMENTS_PER_ORDER
+from video_search import WORDCLOUD_SIZES, WORDCLOUD_FORMAT, WORDCLOUD_MAX_AGE, WORDCLOUD_WIDTH, WORDCLOUD_HEIGHT
+from comment_index import tracked_sentiment
+from singleflight import single_flight, flight_key
+from http_client import start_session, close_session
+from result_store import put_result, get_result
+from renderer import start_renderer, stop_renderer, content_key, RenderQueueFull
+from jobs import schedule, collect, cancel_all
+from bulk import analyze_items, BULK_MAX_ITEMS
+from metrics import timed, observe, start_request, server_timing, render_metrics, SamplingProfiler, PROFILE_ENABLED
+from cache import cache_stats, CACHE_TTLS
+from quota import quota_usage
 
 app = Quart(__name__)
 app.secret_key = 'YOUR_SECRET_KEY'
 
+TABLE_COLUMNS = ['Title', 'Channel', 'Subscribers', 'Views', 'Likes', 'Likes(%)', 'Duration', 'Upload_date', 'Comments']
+PLOT_TYPES = ['total', 'engagement_rate', 'composite_score']
+
+@app.before_serving
+async def startup():
+    start_renderer()
+    await start_session()
+
+@app.after_serving
+async def shutdown():
+    cancel_all()
+    await close_session()
+    stop_renderer()
+
+@app.before_request
+async def start_timing():
+    start_request()
+    g.started = time.perf_counter()
+    # ?profile=1 samples the event loop while this request runs; only honoured when PROFILE_ENABLED=1.
+    g.profiler = SamplingProfiler().start() if PROFILE_ENABLED and request.args.get('profile') == '1' else None
+
+@app.after_request
+async def finish_timing(response):
+    elapsed = time.perf_counter() - g.started
+    response.headers['Server-Timing'] = server_timing(elapsed)
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    observe('http_request_seconds', elapsed, route=route, status=response.status_code)
+    if g.profiler is not None:
+        response.headers['X-Profile'] = await asyncio.to_thread(g.profiler.save, request.endpoint or 'request')
+    return response
+
+async def render_template(template_name, **context):
+    with timed('template_seconds', stage=template_name):
+        return await quart_render_template(template_name, **context)
+
+@app.route('/metrics')
+async def metrics():
+    extra = [('youtube_cache_total', 'counter', {'endpoint': endpoint, 'result': result}, cache_stats[f'{endpoint}_{result}'])
+             for endpoint in CACHE_TTLS for result in ('hits', 'misses', 'disk_hits')]
+    extra += [('youtube_quota_used_units', 'gauge', {'key': key_id, 'day': usage['day']}, usage['used'])
+              for key_id, usage in quota_usage().items() if usage['day']]
+    return Response(render_metrics(extra), mimetype='text/plain; version=0.0.4')
+
 @app.route('/')
 async def index():
     return await render_template('index.html')
@@ -19,8 +77,8 @@ async def search():
         form_data = await request.form
         query = form_data.get('query', '').strip()
         sort_by = form_data.get('sort_by', 'relevance')
-        max_results = int(form_data.get('max_results', 5))
-        max_comments = int(form_data.get('max_comments', 10))  
+        max_results = cap_results(int(form_data.get('max_results', 5)))
+        max_comments = cap_comments(int(form_data.get('max_comments', 10)))
         order_by = form_data.get('order_by', 'relevance')
         if not query:
             return await render_template('index.html', error="Search query cannot be empty.")
@@ -34,24 +92,35 @@ async def results():
     try:
         query = request.args.get('query', '').strip()
         sort_by = request.args.get('sort_by', 'relevance')
-        max_results = int(request.args.get('max_results', 5))
-        max_comments = int(request.args.get('max_comments', 10))  
+        max_results = cap_results(int(request.args.get('max_results', 5)))
+        max_comments = cap_comments(int(request.args.get('max_comments', 10)))
         order_by = request.args.get('order_by', 'relevance')
 
         if not query:
             return await render_template('index.html', error="Search query cannot be empty.")
-        
-        results = await search_youtube(query, sort_by=sort_by, max_results=max_results, max_com=max_comments, order=order_by)
+
+        if request.args.get('stream', '1') != '0':
+            return await render_template(
+                'results.html',
+                query=query,
+                columns=TABLE_COLUMNS,
+                stream_url=url_for('results_stream', query=query, sort_by=sort_by, max_results=max_results, max_comments=max_comments, order_by=order_by)
+            )
+
+        results = await single_flight(
+            flight_key('search', query.lower(), sort_by, max_results, max_comments, order_by),
+            lambda: search_youtube(query, sort_by=sort_by, max_results=max_results, max_com=max_comments, order=order_by))
         if results is None:
             return await render_template('results.html', error="No data found for the query.")
         data, comments = results
         df = data
         df = df.drop(columns=['Video_link'])
-        with shelve.open('data_shelve') as db:
-            db['query_data'] = {'df': df, 'comments': comments}
+        token = await put_result({'df': df, 'comments': comments})
 
         if df is None or df.empty:
             return await render_template('results.html', query=query, error="No data found for the query.")
+        # Charts are drawn in the browser by default, so only the sentiment scoring is worth starting early.
+        schedule(token, 'sentiment', lambda: sentiment_counts(analyze_many, comments))
 
         df.index = df.index + 1
         df_html = df.to_html(classes='table table-striped', index=True, escape=False)
@@ -59,6 +128,7 @@ async def results():
         return await render_template(
             'results.html',
             query=query,
+            token=token,
             table=df_html,
             total_plot=None,
             engagement_rate_plot=None,
@@ -72,25 +142,119 @@ async def results():
         return await render_template('results.html', error=f"Unexpected error: {str(e)}")
 
 
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def table_rows(df):
+    # Titles are sent as text and linked client-side.
+    for index, record in enumerate(to_records(df), 1):
+        record['index'] = index
+        yield record
+
+def chart_frame(df):
+    df = df.copy()
+    df['Title'] = df['Title'].str.extract(r'<a [^>]*>(.*?)</a>', expand=False)
+    return df
+
+def wants_data():
+    # ?format=data returns chart series for the browser to draw instead of server-rendered PNGs.
+    return request.args.get('format') == 'data'
+
+async def sentiment_counts(analyze, comments):
+    return {'counts': await analyze(comments)}
+
+async def sentiment_plot(comments):
+    sentiment_results = await analyze_many(comments)
+    return await sentiment_viz(sentiment_results)
+
+@app.route('/results/stream')
+async def results_stream():
+    try:
+        query = request.args.get('query', '').strip()
+        sort_by = request.args.get('sort_by', 'relevance')
+        max_results = cap_results(int(request.args.get('max_results', 5)))
+        max_comments = cap_comments(int(request.args.get('max_comments', 10)))
+        order_by = request.args.get('order_by', 'relevance')
+        data_mode = wants_data()
+    except ValueError:
+        return Response(sse('failure', {'error': "Invalid input values for query or max results."}), mimetype='text/event-stream')
+
+    async def events():
+        pending = set()
+        try:
+            if not query:
+                yield sse('failure', {'error': "Search query cannot be empty."})
+                return
+            df, comments_future = await single_flight(
+                flight_key('stream', query.lower(), sort_by, max_results, max_comments, order_by),
+                lambda: start_search(query, max_results, sort_by, max_comments, order_by))
+            if df is None or df.empty:
+                yield sse('failure', {'error': "No data found for the query."})
+                return
+            for record in table_rows(df):
+                yield sse('row', record)
+
+            charts_df = df.drop(columns=['Video_link'])
+            if data_mode:
+                yield sse('chart', {'name': 'videos', 'data': chart_series(charts_df)})
+
+            comments = await asyncio.shield(comments_future)
+            token = await put_result({'df': link_titles(df).drop(columns=['Video_link']), 'comments': comments})
+            yield sse('token', {'token': token})
+
+            if data_mode:
+                yield sse('chart', {'name': 'sentiment', 'data': sentiment_series(await analyze_many(comments))})
+                yield sse('done', {})
+                return
+            names = {asyncio.ensure_future(viz_combined(charts_df, plot_type=plot_type)): f'{plot_type}_plot' for plot_type in PLOT_TYPES}
+            names[asyncio.ensure_future(sentiment_plot(comments))] = 'senti_plot'
+            pending = set(names)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        yield sse('chart', {'name': names[task], 'error': str(task.exception())})
+                    else:
+                        yield sse('chart', {'name': names[task], 'image': task.result()})
+            yield sse('done', {})
+        except Exception as e:
+            yield sse('failure', {'error': f"Unexpected error: {e}"})
+        finally:
+            # Stops outstanding renders when the browser goes away mid-stream. The comment fetches
+            # may be shared with other coalesced streams, so they are left to finish and fill the cache.
+            for task in pending:
+                task.cancel()
+
+    response = Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.timeout = None
+    return response
+
 @app.route('/fetch_visualizations')
 async def fetch_visualizations():
-    try:
-        with shelve.open('data_shelve') as db:
-            data = db.get('query_data')
-            df = data['df']
+    token = request.args.get('token')
+
+    async def compute():
+        data = await get_result(token)
+        if data is None:
+            return {"error": "Results expired or not found. Please search again."}
+        df = data['df']
         if df is None:
-            return jsonify({"error": "No data available for the given query"})
-        df['Title'] = df['Title'].str.extract(r'<a [^>]*>(.*?)</a>', expand=False)
-        visualizations = await generate_visualizations(df)
-        return jsonify(visualizations)
+            return {"error": "No data available for the given query"}
+        if wants_data():
+            return {'data': chart_series(chart_frame(df))}
+        return await generate_visualizations(chart_frame(df))
+
+    try:
+        return jsonify(await compute())
 
     except Exception as e:
         return jsonify({"error": f"Error generating visualizations: {e}"})
 
 async def generate_visualizations(df):
-    total_plot = await viz_combined(df, plot_type='total')
-    engagement_rate_plot = await viz_combined(df, plot_type='engagement_rate')
-    composite_score_plot = await viz_combined(df, plot_type='composite_score')
+    total_plot, engagement_rate_plot, composite_score_plot = await asyncio.gather(
+        viz_combined(df, plot_type='total'),
+        viz_combined(df, plot_type='engagement_rate'),
+        viz_combined(df, plot_type='composite_score'))
 
     return {
         "total_plot": total_plot,
@@ -100,21 +264,61 @@ async def generate_visualizations(df):
 
 @app.route("/sentiment_analysis")
 async def sentiment_analysis():
-    try:
-        with shelve.open('data_shelve') as db:
-            data = db.get('query_data')
-            df = data['df']
-            comments = data['comments']
+    token = request.args.get('token')
 
+    async def compute():
+        data = await get_result(token)
+        if data is None:
+            return {"error": "Results expired or not found. Please search again."}
+        df = data['df']
         if df.empty or df is None:
-            return jsonify({"error": "Invalid or missing DataFrame in session."})
-        tasks = [analyze_comments(comment) for comment in comments]
-        sentiment_results = await asyncio.gather(*tasks)
-        df_senti = pd.DataFrame(sentiment_results)
-        return jsonify({'senti_plot':await sentiment_viz(df_senti)})
+            return {"error": "Invalid or missing DataFrame in session."}
+        return await sentiment_counts(analyze_many, data['comments'])
+
+    try:
+        result = await collect(token, 'sentiment', compute)
+        if 'error' in result:
+            return jsonify(result)
+        if wants_data():
+            return jsonify({'data': sentiment_series(result['counts'])})
+        return jsonify({'senti_plot': await sentiment_viz(result['counts'])})
     except Exception as e:
         return jsonify({"error in fetching comments sentiment": f"{e}"})
 
+@app.route('/api/analyze', methods=['POST'])
+async def api_analyze():
+    body = await request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Expected a JSON object with 'videos' and/or 'queries' lists."}), 400
+    videos = body.get('videos') or []
+    queries = body.get('queries') or []
+    if not isinstance(videos, list) or not isinstance(queries, list) or not all(isinstance(value, str) for value in videos + queries):
+        return jsonify({"error": "'videos' and 'queries' must be lists of strings."}), 400
+    if not videos and not queries:
+        return jsonify({"error": "Nothing to analyze."}), 400
+    if len(videos) + len(queries) > BULK_MAX_ITEMS:
+        return jsonify({"error": f"At most {BULK_MAX_ITEMS} items per request."}), 413
+    try:
+        options = {
+            'max_results': int(body.get('max_results', 5)),
+            'max_comments': int(body.get('max_comments', VIDEO_COMMENTS_PER_ORDER)),
+            'sort_by': str(body.get('sort_by', 'relevance')),
+            'order_by': str(body.get('order_by', 'relevance')),
+            'sentiment': bool(body.get('sentiment', False)),
+        }
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid input values for max_results or max_comments."}), 400
+    if not 0 <= options['max_results'] <= SEARCH_MAX_RESULTS or not 0 <= options['max_comments'] <= COMMENTS_MAX_PER_VIDEO:
+        return jsonify({"error": f"max_results must be 0-{SEARCH_MAX_RESULTS} and max_comments 0-{COMMENTS_MAX_PER_VIDEO}."}), 400
+
+    async def lines():
+        async for result in analyze_items(videos, queries, **options):
+            yield json.dumps(result) + '\n'
+
+    response = Response(lines(), mimetype='application/x-ndjson')
+    response.timeout = None
+    return response
+
 @app.route('/<path:video_url>', methods=['GET'])
 async def video_redirect(video_url):
     query_str = request.query_string.decode('utf-8')
@@ -136,71 +340,103 @@ async def video_redirect(video_url):
         if not video_id:
             return "Invalid YouTube URL: missing video id", 400
         
-        results = await process_video(video_id)
+        max_comments = cap_comments(request.args.get('max_comments', VIDEO_COMMENTS_PER_ORDER, type=int))
+        results = await single_flight(flight_key('video', video_id, max_comments),
+                                      lambda: process_video(video_id, max_comments))
         if results is None:
             return await render_template('video_results.html', video_id=video_id, title=None, error="No data found for the videoId.")
-        data, com_rel, com_time = results
-        if com_rel is None:
-            all_com = com_time if com_time is not None else []
-        elif com_time is None:
-            all_com = com_rel
-        else:
-            all_com = com_rel + com_time
-        word_cloud = await generate_wordcloud(all_com) if all_com else None
+        data, com_rel, tracked = results
         df = data
         df = df.drop(columns=['Video_link'])
-        with shelve.open('data_shelve') as db:
-            db['vid_data'] = {'df_vid': df, 'com_rel': com_rel, 'com_time': com_time}
+        token = await put_result({'df_vid': df, 'com_rel': com_rel, 'video_id': video_id})
+        # Sentiment for the relevant comments and for the newly tracked ones is scored while the browser loads the page.
+        if com_rel:
+            schedule(token, 'senti_rel', lambda: sentiment_counts(analyze_comments, com_rel))
+        if tracked['total']:
+            schedule(token, 'senti_time', lambda: tracked_counts(video_id))
         title = df['Title'].str.extract(r'<a [^>]*>(.*?)</a>', expand=False).values[0]
         df.index = df.index + 1
         df_html = df.to_html(classes='table table-striped', index=True, escape=False)
         return await render_template(
             'video_results.html',
             video_id=video_id,
+            token=token,
             title=title,
             table=df_html,
-            com_word_cloud=word_cloud,
-            com_rel=len(com_rel) if com_time else 0,
-            com_time=len(com_time) if com_time else 0,
+            # The word cloud is a separate image request; the comment count in the URL changes when new terms arrive.
+            word_cloud_version=tracked['total'] or None,
+            word_cloud_width=WORDCLOUD_WIDTH,
+            word_cloud_height=WORDCLOUD_HEIGHT,
+            com_rel=len(com_rel) if com_rel else 0,
+            com_tracked=tracked['total'],
+            com_new=tracked['new'],
             senti_rel=None,
             senti_time=None
         )
     else:
         return "Not Found", 404
 
-@app.route("/senti_rel")
-async def sentiment_relevant():
+@app.route('/wordcloud/<video_id>')
+async def wordcloud(video_id):
+    size = request.args.get('size', 'full')
+    if size not in WORDCLOUD_SIZES:
+        return "Unknown word cloud size", 400
+    image_format = 'webp' if WORDCLOUD_FORMAT == 'webp' and 'image/webp' in request.headers.get('Accept', '') else 'png'
+    job = await wordcloud_job(video_id, size, image_format)
+    if job is None:
+        return "No word cloud for this video yet", 404
+    etag = content_key('render_wordcloud', *job)
+    headers = {'Cache-Control': f'public, max-age={WORDCLOUD_MAX_AGE}', 'ETag': f'"{etag}"', 'Vary': 'Accept'}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
     try:
-        with shelve.open('data_shelve') as db:
-            data = db.get('vid_data')
-            df = data['df_vid']
-            comments = data['com_rel']
-        if not comments:
-            return jsonify({"error": "No relevant comments found for the video."})
+        image = await generate_wordcloud(job)
+    except RenderQueueFull as e:
+        print(e)
+        return Response("Renderer busy, try again shortly", status=503, headers={'Retry-After': '2'})
+    return Response(base64.b64decode(image), mimetype=f'image/{image_format}', headers=headers)
+
+async def tracked_counts(video_id):
+    counts = await tracked_sentiment(video_id)
+    if not any(counts.values()):
+        return {"error": "No comments tracked for the video yet."}
+    return {'counts': counts}
+
+async def relevant_counts(data):
+    if not data['com_rel']:
+        return {"error": "No relevant comments found for the video."}
+    return await sentiment_counts(analyze_comments, data['com_rel'])
+
+async def video_sentiment(name, counts):
+    token = request.args.get('token')
+
+    async def compute():
+        data = await get_result(token)
+        if data is None:
+            return {"error": "Results expired or not found. Please reload the video page."}
+        df = data['df_vid']
         if df.empty or df is None:
-            return jsonify({"error": "Invalid or missing DataFrame in session."})
-        sentiment_results = await analyze_comments(comments)
-        df_senti = pd.DataFrame([sentiment_results])
-        return jsonify({'senti_rel':await sentiment_viz(df_senti, type='single')})
+            return {"error": "Invalid or missing DataFrame in session."}
+        return await counts(data)
+
+    try:
+        result = await collect(token, name, compute)
+        if 'error' in result:
+            return jsonify(result)
+        if wants_data():
+            return jsonify({'data': result['counts']})
+        return jsonify({name: await sentiment_viz([result['counts']], type='single')})
     except Exception as e:
         return jsonify({"error in fetching comments sentiment": f"{e}"})
-    
+
+@app.route("/senti_rel")
+async def sentiment_relevant():
+    return await video_sentiment('senti_rel', relevant_counts)
+
 @app.route("/senti_time")
 async def sentiment_time():
-    try:
-        with shelve.open('data_shelve') as db:
-            data = db.get('vid_data')
-            df = data['df_vid']
-            comments = data['com_time']
-        if not comments:
-            return jsonify({"error": "No relevant comments found for the video."})
-        if df.empty or df is None:
-            return jsonify({"error": "Invalid or missing DataFrame in session."})
-        sentiment_results = await analyze_comments(comments)
-        df_senti = pd.DataFrame([sentiment_results])
-        return jsonify({'senti_time':await sentiment_viz(df_senti, type='single')})
-    except Exception as e:
-        return jsonify({"error in fetching comments sentiment": f"{e}"})
+    # Running totals over every comment the index has seen for this video, not just this visit's.
+    return await video_sentiment('senti_time', lambda data: tracked_counts(data['video_id']))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VIDEO_ID = 'gapcheck001'
+
+
+def start_mock(args):
+    from benchmarks.load import _free_port
+    command = [sys.executable, '-m', 'benchmarks.mock_servers',
+               '--youtube-port', str(_free_port()), '--sentiment-port', str(_free_port()),
+               '--latency', '0.01', '--error-rate', str(args.error_rate), '--seed', str(args.seed),
+               '--comment-rate', str(args.comment_rate), '--pages', '100000']
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    urls = dict(process.stdout.readline().strip().split('=', 1) for _ in range(2))
+    return process, urls['YOUTUBE_API_BASE_URL']
+
+
+def _mock_comment_id(number):
+    return f"Ug{hashlib.sha1(f'{VIDEO_ID}|time|{number}'.encode()).hexdigest()[:24]}"
+
+
+def check_index(db_path):
+    # Every mock comment from the oldest one indexed up to the watermark has to be in the index.
+    from benchmarks.mock_servers import COMMENT_BASE, COMMENT_EPOCH
+    conn = sqlite3.connect(db_path)
+    watermark = conn.execute("SELECT watermark FROM videos WHERE video_id = ?", (VIDEO_ID,)).fetchone()[0]
+    backfill = conn.execute("SELECT watermark FROM backfill WHERE video_id = ?", (VIDEO_ID,)).fetchone()
+    ids = {row[0] for row in conn.execute("SELECT comment_id FROM comments WHERE video_id = ?", (VIDEO_ID,))}
+    newest = int((datetime.strptime(watermark, '%Y-%m-%dT%H:%M:%SZ') - COMMENT_EPOCH).total_seconds() // 60)
+    numbers = range(COMMENT_BASE - 10 ** 4, newest + 1)
+    indexed = [number for number in numbers if _mock_comment_id(number) in ids]
+    missing = [number for number in numbers if number >= indexed[0] and _mock_comment_id(number) not in ids]
+    return {'watermark': watermark, 'backfill_to': backfill[0] if backfill else None,
+            'covered': len(indexed), 'missing': missing}
+
+
+async def drive(args):
+    sys.path.insert(0, ROOT)
+    from video_search import process_video
+    from http_client import close_session
+    try:
+        for visit in range(args.visits):
+            started = time.perf_counter()
+            result = await process_video(VIDEO_ID)
+            tracked = result[2] if result else None
+            print(f"visit {visit + 1}: {tracked} in {(time.perf_counter() - started) * 1000:.0f} ms")
+            await asyncio.sleep(args.interval)
+    finally:
+        await close_session()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Revisit one video against the mock API while comments keep arriving and "
+                                                 "pages fail, then check the comment index has no gaps below its watermark.")
+    parser.add_argument('--visits', type=int, default=10)
+    parser.add_argument('--interval', type=float, default=1.0, help="seconds between visits")
+    parser.add_argument('--comment-rate', type=float, default=150.0, help="new comments per second on the mock video")
+    parser.add_argument('--error-rate', type=float, default=0.2, help="fraction of mock YouTube calls that fail")
+    parser.add_argument('--max-new', type=int, default=100, help="COMMENT_INDEX_MAX_NEW for the app")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    mock, youtube_url = start_mock(args)
+    workdir = tempfile.TemporaryDirectory()
+    db_path = os.path.join(workdir.name, 'comments.sqlite3')
+    # Failed pages must reach the comment index instead of being retried away, and every visit refreshes.
+    os.environ.update({
+        'YOUTUBE_API_BASE_URL': youtube_url,
+        'YOUTUBE_API_KEYS': 'bench-key',
+        'YOUTUBE_MAX_RETRIES': '0',
+        'QUOTA_DAILY_LIMIT': str(10 ** 9),
+        'QUOTA_UNITS_PER_SECOND': str(10 ** 6),
+        'QUOTA_BURST': str(10 ** 6),
+        'CACHE_DB_PATH': os.path.join(workdir.name, 'cache.sqlite3'),
+        'QUOTA_DB_PATH': os.path.join(workdir.name, 'quota.sqlite3'),
+        'SINGLEFLIGHT_DB_PATH': os.path.join(workdir.name, 'singleflight.sqlite3'),
+        'COMMENT_INDEX_DB_PATH': db_path,
+        'COMMENT_INDEX_MAX_NEW': str(args.max_new),
+        'COMMENT_INDEX_REFRESH': '0',
+    })
+    try:
+        asyncio.run(drive(args))
+        report = check_index(db_path)
+    finally:
+        mock.terminate()
+        mock.wait()
+        workdir.cleanup()
+    print(f"watermark {report['watermark']}, backfilling to {report['backfill_to']}, "
+          f"{report['covered']} time-ordered comments indexed, {len(report['missing'])} missing below the watermark")
+    if report['missing']:
+        raise SystemExit(f"comments missing below the watermark: {report['missing'][:10]}...")
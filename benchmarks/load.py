@@ -0,0 +1,233 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import re
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN_PATTERN = re.compile(rb'data-token="([A-Za-z0-9_-]+)"|\?token=([A-Za-z0-9_-]+)')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def _peak_rss_mb(pid='self'):
+    # VmHWM is the peak resident set size of a live process; ru_maxrss is the fallback off Linux.
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid == 'self':
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    return 0.0
+
+
+def _render_workers():
+    import multiprocessing
+    return [child.pid for child in multiprocessing.active_children()]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def get(self, client, label, path, headers=None):
+        started = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        body = await response.get_data()
+        self.latencies[label].append(time.perf_counter() - started)
+        failed = response.status_code != 200 or b'"error' in body[:200] or b'alert-danger' in body
+        if failed:
+            self.errors[label] += 1
+        return body
+
+
+def _token(body):
+    match = TOKEN_PATTERN.search(body)
+    if match is None:
+        return ''
+    return (match.group(1) or match.group(2)).decode()
+
+
+def _search_path(args, i):
+    query = f"bench query {i % args.distinct}"
+    return f"/results?stream=0&query={query.replace(' ', '+')}&max_results={args.max_results}&max_comments={args.max_comments}"
+
+
+async def search_flow(client, recorder, args, i):
+    body = await recorder.get(client, '/results', _search_path(args, i))
+    token = _token(body)
+    suffix = '&format=data' if args.chart_data else ''
+    await recorder.get(client, '/fetch_visualizations', f"/fetch_visualizations?token={token}{suffix}")
+    await recorder.get(client, '/sentiment_analysis', f"/sentiment_analysis?token={token}{suffix}")
+
+
+async def video_flow(client, recorder, args, i):
+    video_id = f"vid{i % args.distinct:08d}"
+    body = await recorder.get(client, '/<video_url>', f"/www.youtube.com/watch?v={video_id}&max_comments={args.max_comments}")
+    token = _token(body)
+    suffix = '&format=data' if args.chart_data else ''
+    await recorder.get(client, '/senti_rel', f"/senti_rel?token={token}{suffix}")
+    await recorder.get(client, '/senti_time', f"/senti_time?token={token}{suffix}")
+    if b'/wordcloud/' in body:
+        await recorder.get(client, '/wordcloud', f"/wordcloud/{video_id}", headers={'Accept': 'image/webp,*/*'})
+
+
+SCENARIOS = {'search': search_flow, 'video': video_flow}
+
+
+async def _stats(session, url):
+    async with session.get(url) as response:
+        return await response.json()
+
+
+async def run_scenario(app, name, args, youtube_url, sentiment_url):
+    recorder = Recorder()
+    flow = SCENARIOS[name]
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(i)
+
+    async def user(client):
+        while not queue.empty():
+            await flow(client, recorder, args, queue.get_nowait())
+
+    async with aiohttp.ClientSession() as session:
+        youtube_before = await _stats(session, f"{youtube_url}/stats")
+        sentiment_before = await _stats(session, sentiment_url.replace('/sentiment', '/stats'))
+        client = app.test_client()
+        started = time.perf_counter()
+        # The app prints per-request diagnostics; keep them out of the report.
+        with contextlib.redirect_stdout(io.StringIO()):
+            await asyncio.gather(*(user(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        youtube_after = await _stats(session, f"{youtube_url}/stats")
+        sentiment_after = await _stats(session, sentiment_url.replace('/sentiment', '/stats'))
+
+    outbound = {key: youtube_after.get(key, 0) - youtube_before.get(key, 0) for key in youtube_after}
+    outbound.update({f"sentiment_{key}": sentiment_after.get(key, 0) - sentiment_before.get(key, 0) for key in sentiment_after})
+    return {
+        'scenario': name,
+        'flows': args.requests,
+        'elapsed_s': round(elapsed, 3),
+        'flows_per_s': round(args.requests / elapsed, 2),
+        'endpoints': {
+            label: {
+                'count': len(values),
+                'errors': recorder.errors[label],
+                'p50_ms': round(_percentile(values, 0.5) * 1000, 1),
+                'p95_ms': round(_percentile(values, 0.95) * 1000, 1),
+                'req_per_s': round(len(values) / elapsed, 2),
+            }
+            for label, values in recorder.latencies.items()
+        },
+        'outbound': {key: value for key, value in outbound.items() if value},
+    }
+
+
+def print_report(report):
+    print(f"\n== {report['scenario']}: {report['flows']} flows in {report['elapsed_s']}s ({report['flows_per_s']} flows/s)")
+    print(f"{'endpoint':<24}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>9}")
+    for label, row in report['endpoints'].items():
+        print(f"{label:<24}{row['count']:>7}{row['errors']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['req_per_s']:>9}")
+    print("outbound: " + ", ".join(f"{key}={value}" for key, value in sorted(report['outbound'].items())))
+
+
+def start_mocks(args):
+    youtube_port, sentiment_port = _free_port(), _free_port()
+    command = [sys.executable, '-m', 'benchmarks.mock_servers',
+               '--youtube-port', str(youtube_port), '--sentiment-port', str(sentiment_port),
+               '--latency', str(args.latency), '--error-rate', str(args.error_rate),
+               '--sentiment-latency', str(args.sentiment_latency), '--comment-rate', str(args.comment_rate)]
+    # A separate process keeps the mocks' CPU time off the event loop being measured.
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    urls = dict(process.stdout.readline().strip().split('=', 1) for _ in range(2))
+    return process, urls['YOUTUBE_API_BASE_URL'], urls['MODEL_API_URL']
+
+
+async def main(args):
+    sys.path.insert(0, ROOT)
+    from app import app
+
+    reports = []
+    async with app.test_app():
+        for name in args.scenario:
+            reports.append(await run_scenario(app, name, args, os.environ['YOUTUBE_API_BASE_URL'], os.environ['MODEL_API_URL']))
+            print_report(reports[-1])
+        workers = _render_workers()
+        memory = {'peak_rss_mb': round(_peak_rss_mb(), 1),
+                  'render_workers_peak_rss_mb': [round(_peak_rss_mb(pid), 1) for pid in workers]}
+    print(f"\npeak RSS: {memory['peak_rss_mb']} MB (web), render workers: {memory['render_workers_peak_rss_mb']} MB")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'scenarios': reports, 'memory': memory}, f, indent=2)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Drive the app in-process against local mock YouTube and sentiment servers.")
+    parser.add_argument('--scenario', nargs='+', choices=sorted(SCENARIOS), default=['search', 'video'])
+    parser.add_argument('--requests', type=int, default=50, help="user flows per scenario")
+    parser.add_argument('--concurrency', type=int, default=10, help="simulated concurrent users")
+    parser.add_argument('--distinct', type=int, default=10, help="distinct queries/videos; lower means warmer caches")
+    parser.add_argument('--max-results', type=int, default=10)
+    parser.add_argument('--max-comments', type=int, default=20)
+    parser.add_argument('--chart-data', action='store_true', help="request ?format=data instead of PNG charts")
+    parser.add_argument('--latency', type=float, default=0.05, help="mean mock YouTube latency in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of mock YouTube calls that fail")
+    parser.add_argument('--sentiment-latency', type=float, default=0.05)
+    parser.add_argument('--comment-rate', type=float, default=0.0, help="new comments per second per mock video")
+    parser.add_argument('--json', help="also write the report to this file")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    mocks, youtube_url, sentiment_url = start_mocks(args)
+    workdir = tempfile.TemporaryDirectory()
+    # Configuration is read at import time, so it has to be in place before the app is imported.
+    # Cache, quota and result files go to a scratch directory so every run starts cold.
+    for key, value in {
+        'YOUTUBE_API_KEYS': 'bench-key-1,bench-key-2',
+        'QUOTA_DAILY_LIMIT': str(10 ** 9),
+        'QUOTA_UNITS_PER_SECOND': str(10 ** 6),
+        'QUOTA_BURST': str(10 ** 6),
+        'CACHE_DB_PATH': os.path.join(workdir.name, 'cache.sqlite3'),
+        'RESULT_DB_PATH': os.path.join(workdir.name, 'results.sqlite3'),
+        'QUOTA_DB_PATH': os.path.join(workdir.name, 'quota.sqlite3'),
+        'SINGLEFLIGHT_DB_PATH': os.path.join(workdir.name, 'singleflight.sqlite3'),
+        'COMMENT_INDEX_DB_PATH': os.path.join(workdir.name, 'comments.sqlite3'),
+    }.items():
+        os.environ.setdefault(key, value)
+    os.environ['YOUTUBE_API_BASE_URL'], os.environ['MODEL_API_URL'] = youtube_url, sentiment_url
+    try:
+        asyncio.run(main(args))
+    finally:
+        mocks.terminate()
+        mocks.wait()
+        workdir.cleanup()
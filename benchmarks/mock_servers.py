@@ -0,0 +1,338 @@
+import argparse
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from aiohttp import web
+
+# Trimmed copies of real YouTube Data API v3 responses. Items are cycled and re-keyed, so any
+# number of distinct videos, channels and comments can be served from a handful of recordings.
+# Pass --fixtures DIR with <endpoint>.json files (search, videos, channels, commentThreads)
+# to replay your own recordings instead.
+RECORDED = {
+    'search': {
+        'kind': 'youtube#searchListResponse',
+        'regionCode': 'US',
+        'pageInfo': {'totalResults': 1000000, 'resultsPerPage': 50},
+        'items': [
+            {'kind': 'youtube#searchResult', 'id': {'kind': 'youtube#video', 'videoId': 'dQw4w9WgXcQ'},
+             'snippet': {'publishedAt': '2009-10-25T06:57:33Z', 'channelId': 'UCuAXFkgsw1L7xaCfnd5JJOw',
+                         'title': 'Rick Astley - Never Gonna Give You Up (Official Music Video)',
+                         'description': 'The official video for “Never Gonna Give You Up” by Rick Astley.',
+                         'channelTitle': 'Rick Astley', 'liveBroadcastContent': 'none',
+                         'publishTime': '2009-10-25T06:57:33Z'}},
+        ],
+    },
+    'videos': {
+        'kind': 'youtube#videoListResponse',
+        'items': [
+            {'kind': 'youtube#video', 'id': 'dQw4w9WgXcQ',
+             'snippet': {'publishedAt': '2009-10-25T06:57:33Z', 'channelId': 'UCuAXFkgsw1L7xaCfnd5JJOw',
+                         'title': 'Rick Astley - Never Gonna Give You Up (Official Music Video)',
+                         'description': 'The official video for “Never Gonna Give You Up” by Rick Astley.',
+                         'channelTitle': 'Rick Astley', 'categoryId': '10', 'liveBroadcastContent': 'none'},
+             'contentDetails': {'duration': 'PT3M33S', 'dimension': '2d', 'definition': 'hd', 'caption': 'false'},
+             'statistics': {'viewCount': '1601124213', 'likeCount': '18412455', 'favoriteCount': '0', 'commentCount': '2401163'}},
+            {'kind': 'youtube#video', 'id': 'jNQXAC9IVRw',
+             'snippet': {'publishedAt': '2005-04-24T03:31:52Z', 'channelId': 'UC4QobU6STFB0P71PMvOGN5A',
+                         'title': 'Me at the zoo', 'description': 'The first video on YouTube.',
+                         'channelTitle': 'jawed', 'categoryId': '1', 'liveBroadcastContent': 'none'},
+             'contentDetails': {'duration': 'PT19S', 'dimension': '2d', 'definition': 'sd', 'caption': 'true'},
+             'statistics': {'viewCount': '345201987', 'likeCount': '17834210', 'favoriteCount': '0', 'commentCount': '10512344'}},
+            {'kind': 'youtube#video', 'id': 'kJQP7kiw5Fk',
+             'snippet': {'publishedAt': '2017-01-12T19:06:32Z', 'channelId': 'UCLp8RBhQHu9wSsq62j_Md6A',
+                         'title': 'Luis Fonsi - Despacito ft. Daddy Yankee', 'description': 'Despacito',
+                         'channelTitle': 'LuisFonsiVEVO', 'categoryId': '10', 'liveBroadcastContent': 'none'},
+             'contentDetails': {'duration': 'PT4M42S', 'dimension': '2d', 'definition': 'hd', 'caption': 'false'},
+             'statistics': {'viewCount': '8612399012', 'likeCount': '53712003', 'favoriteCount': '0', 'commentCount': '4521312'}},
+            {'kind': 'youtube#video', 'id': 'LXb3EKWsInQ',
+             'snippet': {'publishedAt': '2015-10-15T21:27:10Z', 'channelId': 'UCpOlOeQjj7EsVnDh3zuCgsA',
+                         'title': 'COSTA RICA IN 4K 60fps HDR (ULTRA HD)', 'description': 'Costa Rica in 4K.',
+                         'channelTitle': 'Jacob + Katie Schwarz', 'categoryId': '19', 'liveBroadcastContent': 'none'},
+             'contentDetails': {'duration': 'PT5M14S', 'dimension': '2d', 'definition': 'hd', 'caption': 'false'},
+             'statistics': {'viewCount': '179812345', 'likeCount': '1212345', 'favoriteCount': '0'}},
+            {'kind': 'youtube#video', 'id': 'jfKfPfyJRdk',
+             'snippet': {'publishedAt': '2022-07-12T12:12:29Z', 'channelId': 'UCSJ4gkVC6NrvII8umztf0Ow',
+                         'title': 'lofi hip hop radio 📚 - beats to relax/study to', 'description': 'Lofi Girl live.',
+                         'channelTitle': 'Lofi Girl', 'categoryId': '10', 'liveBroadcastContent': 'live'},
+             'contentDetails': {'duration': 'P0D', 'dimension': '2d', 'definition': 'hd', 'caption': 'false'},
+             'statistics': {'viewCount': '0', 'likeCount': '1501234', 'favoriteCount': '0', 'commentCount': '0'}},
+            {'kind': 'youtube#video', 'id': 'sVx1mJDeUjY',
+             'snippet': {'publishedAt': '2011-08-01T14:00:03Z', 'channelId': 'UC4rlAVgAK0SGk-yTfe48Qpw',
+                         'title': '10 Hours of Relaxing Ocean Waves', 'description': 'Sleep sounds.',
+                         'channelTitle': 'Relaxing White Noise', 'categoryId': '22', 'liveBroadcastContent': 'none'},
+             'contentDetails': {'duration': 'PT10H0M1S', 'dimension': '2d', 'definition': 'hd', 'caption': 'false'},
+             'statistics': {'viewCount': '48123456', 'likeCount': '301234', 'favoriteCount': '0', 'commentCount': '14322'}},
+        ],
+        'pageInfo': {'totalResults': 1, 'resultsPerPage': 1},
+    },
+    'channels': {
+        'kind': 'youtube#channelListResponse',
+        'items': [
+            {'kind': 'youtube#channel', 'id': 'UCuAXFkgsw1L7xaCfnd5JJOw',
+             'statistics': {'viewCount': '2498700136', 'subscriberCount': '4210000', 'hiddenSubscriberCount': False, 'videoCount': '255'}},
+            {'kind': 'youtube#channel', 'id': 'UC4QobU6STFB0P71PMvOGN5A',
+             'statistics': {'viewCount': '345988763', 'subscriberCount': '4530000', 'hiddenSubscriberCount': False, 'videoCount': '1'}},
+            {'kind': 'youtube#channel', 'id': 'UCLp8RBhQHu9wSsq62j_Md6A',
+             'statistics': {'viewCount': '25012345678', 'subscriberCount': '33100000', 'hiddenSubscriberCount': False, 'videoCount': '112'}},
+            {'kind': 'youtube#channel', 'id': 'UCpOlOeQjj7EsVnDh3zuCgsA',
+             'statistics': {'viewCount': '301234567', 'hiddenSubscriberCount': True, 'videoCount': '78'}},
+        ],
+        'pageInfo': {'totalResults': 1, 'resultsPerPage': 1},
+    },
+    'commentThreads': {
+        'kind': 'youtube#commentThreadListResponse',
+        'pageInfo': {'totalResults': 20, 'resultsPerPage': 20},
+        'items': [
+            {'kind': 'youtube#commentThread', 'id': 'UgzYpJ7cZ0j1B6U4aI14AaABAg',
+             'snippet': {'videoId': 'dQw4w9WgXcQ', 'canReply': True, 'totalReplyCount': 12, 'isPublic': True,
+                         'topLevelComment': {'kind': 'youtube#comment', 'id': 'UgzYpJ7cZ0j1B6U4aI14AaABAg',
+                                             'snippet': {'textDisplay': 'Still a masterpiece after all these years.',
+                                                         'textOriginal': 'Still a masterpiece after all these years.',
+                                                         'authorDisplayName': '@listener', 'likeCount': 1520,
+                                                         'publishedAt': '2024-03-01T10:00:00Z', 'updatedAt': '2024-03-01T10:00:00Z'}}}},
+            {'kind': 'youtube#commentThread', 'id': 'UgwQ2xS3c5dF4m1d2y94AaABAg',
+             'snippet': {'videoId': 'dQw4w9WgXcQ', 'canReply': True, 'totalReplyCount': 0, 'isPublic': True,
+                         'topLevelComment': {'kind': 'youtube#comment', 'id': 'UgwQ2xS3c5dF4m1d2y94AaABAg',
+                                             'snippet': {'textDisplay': 'I got rickrolled again, terrible.',
+                                                         'textOriginal': 'I got rickrolled again, terrible.',
+                                                         'authorDisplayName': '@viewer', 'likeCount': 3,
+                                                         'publishedAt': '2024-02-28T08:30:00Z', 'updatedAt': '2024-02-28T08:30:00Z'}}}},
+            {'kind': 'youtube#commentThread', 'id': 'Ugx9pL0kQ1w2e3r4t5y64AaABAg',
+             'snippet': {'videoId': 'dQw4w9WgXcQ', 'canReply': True, 'totalReplyCount': 1, 'isPublic': True,
+                         'topLevelComment': {'kind': 'youtube#comment', 'id': 'Ugx9pL0kQ1w2e3r4t5y64AaABAg',
+                                             'snippet': {'textDisplay': 'Who is watching this in 2024?',
+                                                         'textOriginal': 'Who is watching this in 2024?',
+                                                         'authorDisplayName': '@someone', 'likeCount': 87,
+                                                         'publishedAt': '2024-02-20T17:45:12Z', 'updatedAt': '2024-02-20T17:45:12Z'}}}},
+        ],
+    },
+}
+
+SENTIMENT_LABELS = ('Positive', 'Negative', 'Neutral')
+COMMENT_EPOCH = datetime(2022, 1, 1)
+COMMENT_BASE = 10 ** 6
+
+
+def _index(seed, size):
+    # Stable across processes, unlike hash().
+    return int(hashlib.md5(seed.encode()).hexdigest(), 16) % size
+
+
+def _pick(seed, items):
+    return items[_index(seed, len(items))]
+
+
+def _video_id(query, page, index):
+    return hashlib.sha1(f"{query}|{page}|{index}".encode()).hexdigest()[:11]
+
+
+def _channel_id(video_id):
+    return 'UC' + hashlib.sha1(video_id.encode()).hexdigest()[:22]
+
+
+class MockYouTube:
+    # Serves YouTube Data API shaped responses with optional latency, jitter and injected errors.
+
+    def __init__(self, latency=0.05, jitter=0.5, error_rate=0.0, pages=5, channels=None, fixtures=None, seed=0, comment_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.pages = pages
+        self.channels = channels
+        self.comment_rate = comment_rate
+        self.started = time.monotonic()
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.recorded = copy.deepcopy(RECORDED)
+        if fixtures:
+            for endpoint in self.recorded:
+                path = os.path.join(fixtures, f"{endpoint}.json")
+                if os.path.exists(path):
+                    with open(path) as f:
+                        self.recorded[endpoint] = json.load(f)
+
+    async def _delay(self):
+        if self.latency > 0:
+            await asyncio.sleep(self.latency * self.random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def _error(self):
+        if self.random.random() >= self.error_rate:
+            return None
+        status, reason = self.random.choice([(503, 'backendError'), (403, 'rateLimitExceeded'), (500, 'internalError')])
+        body = {'error': {'code': status, 'message': reason, 'errors': [{'reason': reason, 'domain': 'youtube'}]}}
+        return web.json_response(body, status=status)
+
+    def _page(self, endpoint, items, page):
+        data = {key: value for key, value in self.recorded[endpoint].items() if key != 'items'}
+        data['items'] = items
+        if page + 1 < self.pages:
+            data['nextPageToken'] = f"PAGE{page + 1}"
+        return web.json_response(data)
+
+    def _template(self, endpoint, seed):
+        return copy.deepcopy(_pick(seed, self.recorded[endpoint]['items']))
+
+    async def _handle(self, endpoint, request, build):
+        self.calls[endpoint] += 1
+        await self._delay()
+        error = self._error()
+        if error is not None:
+            self.calls['errors'] += 1
+            return error
+        return build(request)
+
+    def _search(self, request):
+        query = request.query.get('q', '')
+        page = int(request.query.get('pageToken', 'PAGE0')[4:] or 0)
+        size = int(request.query.get('maxResults', 5))
+        items = []
+        for index in range(size):
+            video_id = _video_id(query, page, index)
+            item = self._template('search', video_id)
+            item['id']['videoId'] = video_id
+            items.append(item)
+        return self._page('search', items, page)
+
+    def _videos(self, request):
+        items = []
+        for video_id in request.query.get('id', '').split(','):
+            item = self._template('videos', video_id)
+            item['id'] = video_id
+            channel_key = video_id if self.channels is None else str(_index(video_id, self.channels))
+            item['snippet']['channelId'] = _channel_id(channel_key)
+            item['snippet']['title'] = f"{item['snippet']['title']} #{video_id}"
+            items.append(item)
+        return web.json_response(dict(self.recorded['videos'], items=items))
+
+    def _channels(self, request):
+        items = []
+        for channel_id in request.query.get('id', '').split(','):
+            item = self._template('channels', channel_id)
+            item['id'] = channel_id
+            items.append(item)
+        return web.json_response(dict(self.recorded['channels'], items=items))
+
+    def _comment(self, video_id, key, published_at=None):
+        comment_id = f"Ug{hashlib.sha1(f'{video_id}|{key}'.encode()).hexdigest()[:24]}"
+        item = self._template('commentThreads', comment_id)
+        item['id'] = item['snippet']['topLevelComment']['id'] = comment_id
+        # Real comments are nearly all distinct, so the sentiment label cache should not see repeats.
+        comment = item['snippet']['topLevelComment']['snippet']
+        comment['textOriginal'] = comment['textDisplay'] = f"{comment['textOriginal']} ({comment_id[-6:]})"
+        if published_at is not None:
+            comment['publishedAt'] = comment['updatedAt'] = published_at
+        item['snippet']['videoId'] = video_id
+        return item
+
+    def _comment_threads(self, request):
+        video_id = request.query.get('videoId', '')
+        order = request.query.get('order', 'relevance')
+        size = int(request.query.get('maxResults', 20))
+        if order == 'time':
+            return self._time_comments(video_id, request.query.get('pageToken'), size)
+        page = int(request.query.get('pageToken', 'PAGE0')[4:] or 0)
+        items = [self._comment(video_id, f'{order}|{page}|{index}') for index in range(size)]
+        return self._page('commentThreads', items, page)
+
+    def _time_comments(self, video_id, page_token, size):
+        # Newest first, numbered so publishedAt falls one minute per comment. With --comment-rate new
+        # comments keep arriving at the head; the page token pins the head so later pages line up.
+        if page_token:
+            head, offset = (int(part) for part in page_token[4:].split('-'))
+        else:
+            head, offset = COMMENT_BASE + int((time.monotonic() - self.started) * self.comment_rate), 0
+        items = []
+        for number in range(head - offset, head - offset - size, -1):
+            published_at = (COMMENT_EPOCH + timedelta(minutes=number)).strftime('%Y-%m-%dT%H:%M:%SZ')
+            items.append(self._comment(video_id, f'time|{number}', published_at))
+        data = {key: value for key, value in self.recorded['commentThreads'].items() if key != 'items'}
+        data['items'] = items
+        if offset // max(size, 1) + 1 < self.pages:
+            data['nextPageToken'] = f"TIME{head}-{offset + size}"
+        return web.json_response(data)
+
+    def app(self):
+        app = web.Application()
+        app.add_routes([
+            web.get('/search', lambda request: self._handle('search', request, self._search)),
+            web.get('/videos', lambda request: self._handle('videos', request, self._videos)),
+            web.get('/channels', lambda request: self._handle('channels', request, self._channels)),
+            web.get('/commentThreads', lambda request: self._handle('commentThreads', request, self._comment_threads)),
+            web.get('/stats', lambda request: web.json_response(self.calls)),
+        ])
+        return app
+
+
+class MockSentiment:
+    # Stand-in for MODEL_API_URL: labels are a stable function of the comment text.
+
+    def __init__(self, latency=0.05, per_comment=0.0005):
+        self.latency = latency
+        self.per_comment = per_comment
+        self.calls = Counter()
+
+    async def _sentiment(self, request):
+        comments = (await request.json()).get('comments', [])
+        self.calls['requests'] += 1
+        self.calls['comments'] += len(comments)
+        await asyncio.sleep(self.latency + self.per_comment * len(comments))
+        return web.json_response({'sentiments': [_pick(comment, SENTIMENT_LABELS) for comment in comments]})
+
+    def app(self):
+        app = web.Application()
+        app.add_routes([
+            web.post('/sentiment', self._sentiment),
+            web.get('/stats', lambda request: web.json_response(self.calls)),
+        ])
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve mock YouTube Data API and sentiment endpoints.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--youtube-port', type=int, default=8765)
+    parser.add_argument('--sentiment-port', type=int, default=8766)
+    parser.add_argument('--latency', type=float, default=0.05, help="mean YouTube API latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.5, help="latency jitter as a fraction of the mean")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of YouTube calls answered with 403/5xx")
+    parser.add_argument('--pages', type=int, default=5, help="pages available for search and comment threads")
+    parser.add_argument('--channels', type=int, default=None, help="spread videos over this many channels")
+    parser.add_argument('--fixtures', default=None, help="directory of recorded <endpoint>.json responses")
+    parser.add_argument('--sentiment-latency', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--comment-rate', type=float, default=0.0, help="new time-ordered comments per second on every video")
+    args = parser.parse_args()
+
+    youtube = MockYouTube(args.latency, args.jitter, args.error_rate, args.pages, args.channels, args.fixtures, args.seed, args.comment_rate)
+    sentiment = MockSentiment(args.sentiment_latency)
+
+    async def serve():
+        runners = []
+        for app, port in ((youtube.app(), args.youtube_port), (sentiment.app(), args.sentiment_port)):
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, args.host, port).start()
+            runners.append(runner)
+        print(f"YOUTUBE_API_BASE_URL=http://{args.host}:{args.youtube_port}")
+        print(f"MODEL_API_URL=http://{args.host}:{args.sentiment_port}/sentiment", flush=True)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            for runner in runners:
+                await runner.cleanup()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
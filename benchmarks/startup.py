@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib', 'seaborn', 'wordcloud', 'PIL')
+IMPORTTIME_PATTERN = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def _rss_mb(pid='self', field='VmRSS'):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(f'{field}:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return 0.0
+
+
+def _heavy_loaded():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+async def _serve_index(app, settle):
+    import multiprocessing
+    async with app.test_app():
+        client = app.test_client()
+        started = time.perf_counter()
+        response = await client.get('/')
+        await response.get_data()
+        first_request = time.perf_counter() - started
+        # The render pool starts with the app; give its workers time to finish importing charts.
+        await _wait_for_workers(settle)
+        workers = [_rss_mb(child.pid) for child in multiprocessing.active_children()]
+        return {
+            'status': response.status_code,
+            'first_request_ms': round(first_request * 1000, 1),
+            'rss_mb': _rss_mb(),
+            'heavy_modules': _heavy_loaded(),
+            'render_workers_rss_mb': workers,
+        }
+
+
+async def _wait_for_workers(settle):
+    import asyncio
+    import multiprocessing
+    deadline = time.monotonic() + settle
+    previous = None
+    while time.monotonic() < deadline:
+        current = [_rss_mb(child.pid) for child in multiprocessing.active_children()]
+        if current and current == previous:
+            return
+        previous = current
+        await asyncio.sleep(0.5)
+
+
+def child(args):
+    # Runs in a fresh interpreter, so nothing the parent imported is counted.
+    import asyncio
+    sys.path.insert(0, ROOT)
+    baseline = _rss_mb()
+    started = time.perf_counter()
+    from app import app
+    elapsed = time.perf_counter() - started
+    result = {
+        'import_ms': round(elapsed * 1000, 1),
+        'rss_before_import_mb': baseline,
+        'rss_after_import_mb': _rss_mb(),
+        'heavy_modules_after_import': _heavy_loaded(),
+    }
+    if not args.import_only:
+        result['index'] = asyncio.run(_serve_index(app, args.settle))
+    print(json.dumps(result))
+
+
+def _environment(workdir):
+    env = dict(os.environ)
+    for key, value in {
+        'YOUTUBE_API_KEYS': 'bench-key',
+        'CACHE_DB_PATH': os.path.join(workdir, 'cache.sqlite3'),
+        'RESULT_DB_PATH': os.path.join(workdir, 'results.sqlite3'),
+        'QUOTA_DB_PATH': os.path.join(workdir, 'quota.sqlite3'),
+        'SINGLEFLIGHT_DB_PATH': os.path.join(workdir, 'singleflight.sqlite3'),
+        'COMMENT_INDEX_DB_PATH': os.path.join(workdir, 'comments.sqlite3'),
+    }.items():
+        env.setdefault(key, value)
+    return env
+
+
+def import_costs(env, top):
+    # -X importtime reports the cumulative microseconds of every module imported by `import app`;
+    # app itself and the modules it imports directly are listed.
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                             cwd=ROOT, env=env, capture_output=True, text=True)
+    costs = []
+    for line in process.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match and len(match.group(3)) <= 3:
+            costs.append((match.group(4), int(match.group(2)) / 1000))
+    costs.sort(key=lambda item: item[1], reverse=True)
+    return [{'module': name, 'cumulative_ms': round(ms, 1)} for name, ms in costs[:top]]
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        env = _environment(workdir)
+        command = [sys.executable, '-m', 'benchmarks.startup', '--child', '--settle', str(args.settle)]
+        if args.import_only:
+            command.append('--import-only')
+        runs = []
+        for _ in range(args.repeat):
+            process = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+            if process.returncode != 0:
+                sys.stderr.write(process.stderr)
+                raise SystemExit(process.returncode)
+            runs.append(json.loads(process.stdout.strip().splitlines()[-1]))
+        return {'runs': runs, 'top_imports': import_costs(env, args.top)}
+
+
+def print_report(report):
+    runs = report['runs']
+    imports = [run['import_ms'] for run in runs]
+    print(f"import app: median {statistics.median(imports):.1f} ms, min {min(imports):.1f} ms over {len(runs)} runs")
+    print(f"RSS: {runs[-1]['rss_before_import_mb']} MB interpreter, {runs[-1]['rss_after_import_mb']} MB after import")
+    print(f"heavy modules after import: {', '.join(runs[-1]['heavy_modules_after_import']) or 'none'}")
+    if 'index' in runs[-1]:
+        first = [run['index']['first_request_ms'] for run in runs]
+        index = runs[-1]['index']
+        print(f"GET /: status {index['status']}, first request median {statistics.median(first):.1f} ms, RSS {index['rss_mb']} MB")
+        print(f"heavy modules after GET /: {', '.join(index['heavy_modules']) or 'none'}")
+        print(f"render workers RSS: {index['render_workers_rss_mb']} MB")
+    print("\nslowest imports from app (cumulative):")
+    for row in report['top_imports']:
+        print(f"{row['cumulative_ms']:>9.1f} ms  {row['module']}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure how long a fresh web worker takes to import the app and how much memory it holds.")
+    parser.add_argument('--repeat', type=int, default=5, help="fresh interpreters to time")
+    parser.add_argument('--top', type=int, default=15, help="imports to list from -X importtime")
+    parser.add_argument('--settle', type=float, default=10.0, help="seconds to wait for render workers to finish booting")
+    parser.add_argument('--import-only', action='store_true', help="skip starting the app and serving /")
+    parser.add_argument('--fail-on-heavy', action='store_true', help="exit non-zero if plain startup loads pandas or plotting libraries")
+    parser.add_argument('--json', help="also write the report to this file")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.child:
+        child(args)
+        raise SystemExit(0)
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), **report}, f, indent=2)
+    last = report['runs'][-1]
+    heavy = last['heavy_modules_after_import'] + last.get('index', {}).get('heavy_modules', [])
+    if args.fail_on_heavy and heavy:
+        raise SystemExit(f"heavy modules loaded at startup: {', '.join(sorted(set(heavy)))}")
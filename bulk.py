@@ -0,0 +1,127 @@
+from youtube_search import start_search, fetch_videos_details, fetch_channels_details, fetch_comments
+from video_search import comment_budget, VIDEO_COMMENTS_PER_ORDER
+from sentiment_client import analyze_many
+from normalize import normalize_videos, to_records
+from singleflight import single_flight, flight_key
+from fanout import run_bounded
+from metrics import timed
+from urllib.parse import urlparse, parse_qs
+import asyncio
+import os
+import re
+
+BULK_CONCURRENCY = int(os.getenv('BULK_CONCURRENCY', 8))
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', 500))
+
+VIDEO_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+
+def parse_video_id(value):
+    # Accepts a bare video ID or a watch, youtu.be, shorts, embed or live URL.
+    value = value.strip()
+    if VIDEO_ID_PATTERN.match(value):
+        return value
+    parsed = urlparse(value if '//' in value else f"https://{value}")
+    host = parsed.netloc.lower().removeprefix('www.').removeprefix('m.')
+    if host == 'youtu.be':
+        candidate = parsed.path.strip('/').split('/')[0]
+    elif host in ('youtube.com', 'music.youtube.com'):
+        if parsed.path == '/watch':
+            candidate = parse_qs(parsed.query).get('v', [''])[0]
+        else:
+            parts = parsed.path.strip('/').split('/')
+            candidate = parts[1] if len(parts) > 1 and parts[0] in ('shorts', 'embed', 'live', 'v') else ''
+    else:
+        return None
+    return candidate if VIDEO_ID_PATTERN.match(candidate) else None
+
+
+async def _video_result(item, record, video, max_comments, sentiment):
+    result = dict(item, video=record)
+    if sentiment:
+        rel_count, time_count = comment_budget(video, max_comments)
+        comments_rel, comments_time = await run_bounded([fetch_comments(item['video_id'], rel_count, 'relevance'),
+                                                         fetch_comments(item['video_id'], time_count, 'time')])
+        counts_rel, counts_time = await analyze_many([comments_rel, comments_time])
+        result['comments'] = {'relevance': len(comments_rel or []), 'time': len(comments_time or [])}
+        result['sentiment'] = {'relevance': counts_rel, 'time': counts_time}
+    return result
+
+
+async def _query_result(item, max_results, max_comments, sort_by, order_by, sentiment):
+    query = item['query']
+    max_com = max_comments if sentiment else 0
+    df, comments_future = await single_flight(
+        flight_key('stream', query.lower(), sort_by, max_results, max_com, order_by),
+        lambda: start_search(query, max_results, sort_by, max_com, order_by))
+    if df is None or df.empty:
+        return dict(item, error="No data found for the query.")
+    result = dict(item, videos=to_records(df))
+    # The comment fetches may be shared with a coalesced caller, so they are awaited without cancelling them.
+    comments = await asyncio.shield(comments_future)
+    if sentiment:
+        result['sentiment'] = await analyze_many(comments)
+    return result
+
+
+async def _guarded(item, coro):
+    try:
+        return await coro
+    except Exception as e:
+        return dict(item, error=str(e) or type(e).__name__)
+
+
+async def analyze_items(videos=(), queries=(), max_results=5, max_comments=VIDEO_COMMENTS_PER_ORDER,
+                        sort_by='relevance', order_by='relevance', sentiment=False, concurrency=None):
+    # Yields one JSON-ready dict per input as soon as it is done. Video details and channels are
+    # looked up for the whole batch up front (50 IDs per call); comments, sentiment and searches run
+    # per item under a shared concurrency limit. Failures are reported on the item's own line.
+    items = [{'index': i, 'input': value, 'type': 'video', 'video_id': parse_video_id(value)} for i, value in enumerate(videos)]
+    items += [{'index': len(items) + i, 'input': value, 'type': 'query', 'query': value.strip()} for i, value in enumerate(queries)]
+    semaphore = asyncio.Semaphore(concurrency or BULK_CONCURRENCY)
+
+    async def bounded(item, coro):
+        async with semaphore:
+            return await _guarded(item, coro)
+
+    ready = []
+    pending = []
+    video_items = []
+    for item in items:
+        if item['type'] == 'video' and not item['video_id']:
+            ready.append(dict(item, error="Not a YouTube video ID or URL."))
+        elif item['type'] == 'query' and not item['query']:
+            ready.append(dict(item, error="Search query cannot be empty."))
+        elif item['type'] == 'video':
+            video_items.append(item)
+        else:
+            pending.append(asyncio.ensure_future(bounded(item, _query_result(item, max_results, max_comments, sort_by, order_by, sentiment))))
+    try:
+        for result in ready:
+            yield result
+        if video_items:
+            try:
+                with timed('pipeline_stage_seconds', stage='details'):
+                    details = await fetch_videos_details([item['video_id'] for item in video_items])
+                    channels = await fetch_channels_details([video['snippet']['channelId'] for video in details.values() if 'snippet' in video])
+            except Exception as e:
+                details, error = {}, str(e) or type(e).__name__
+            else:
+                error = "Video not found or unavailable."
+            found = []
+            for item in video_items:
+                if 'snippet' in details.get(item['video_id'], {}):
+                    found.append(item)
+                else:
+                    yield dict(item, error=error)
+            if found:
+                found_videos = [details[item['video_id']] for item in found]
+                with timed('pipeline_stage_seconds', stage='normalize'):
+                    records = to_records(normalize_videos(found_videos, channels))
+                for item, record, video in zip(found, records, found_videos):
+                    pending.append(asyncio.ensure_future(bounded(item, _video_result(item, record, video, max_comments, sentiment))))
+        for next_done in asyncio.as_completed(pending):
+            yield await next_done
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,129 @@
+from collections import Counter, OrderedDict
+from urllib.parse import urlencode
+from sqlite_store import sqlite_connection, purge_expired
+import asyncio
+import json
+import os
+import sqlite3
+import time
+
+CACHE_DB_PATH = os.getenv('CACHE_DB_PATH', 'cache.sqlite3')
+CACHE_MEMORY_ITEMS = int(os.getenv('CACHE_MEMORY_ITEMS', 2048))
+CACHE_TTLS = {
+    'search': int(os.getenv('CACHE_TTL_SEARCH', 900)),
+    'videos': int(os.getenv('CACHE_TTL_VIDEOS', 600)),
+    'channels': int(os.getenv('CACHE_TTL_CHANNELS', 6 * 3600)),
+    'commentThreads': int(os.getenv('CACHE_TTL_COMMENTS', 300)),
+}
+
+cache_stats = Counter()
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at is not None and expires_at < time.time():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self._data[key] = (time.time() + ttl if ttl else None, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_memory = LRUCache(CACHE_MEMORY_ITEMS)
+
+
+def make_key(endpoint, params):
+    # The API key is deliberately left out so every key shares the same entries.
+    items = sorted((k, str(v)) for k, v in params.items() if k != 'key' and v is not None)
+    return f"{endpoint}?{urlencode(items)}"
+
+
+def _connection():
+    return sqlite_connection(CACHE_DB_PATH, "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)")
+
+
+def _disk_get_many(keys):
+    conn = _connection()
+    placeholders = ','.join('?' * len(keys))
+    rows = conn.execute(f"SELECT key, expires_at, value FROM responses WHERE key IN ({placeholders})", keys).fetchall()
+    now = time.time()
+    return {key: (expires_at, json.loads(value)) for key, expires_at, value in rows if expires_at > now}
+
+
+def _disk_set_many(entries):
+    conn = _connection()
+    conn.executemany("INSERT OR REPLACE INTO responses (key, expires_at, value) VALUES (?, ?, ?)",
+                     [(key, expires_at, json.dumps(value)) for key, expires_at, value in entries])
+    purge_expired(conn, 'responses', 0.01)
+
+
+async def cache_get_many(endpoint, params_list):
+    ttl = CACHE_TTLS.get(endpoint, 0)
+    keys = [make_key(endpoint, params) for params in params_list]
+    if not ttl:
+        return [None] * len(keys)
+    found = {key: _memory.get(key) for key in keys}
+    missing = [key for key, value in found.items() if value is None]
+    if missing and CACHE_DB_PATH:
+        try:
+            rows = await asyncio.to_thread(_disk_get_many, missing)
+        except sqlite3.Error as e:
+            print(f"Cache read failed: {e}")
+            rows = {}
+        for key, (expires_at, value) in rows.items():
+            _memory.set(key, value, ttl=expires_at - time.time())
+            found[key] = value
+            cache_stats[f'{endpoint}_disk_hits'] += 1
+    results = [found[key] for key in keys]
+    hits = sum(value is not None for value in results)
+    cache_stats[f'{endpoint}_hits'] += hits
+    cache_stats[f'{endpoint}_misses'] += len(results) - hits
+    return results
+
+
+async def cache_set_many(endpoint, entries):
+    ttl = CACHE_TTLS.get(endpoint, 0)
+    if not ttl or not entries:
+        return
+    expires_at = time.time() + ttl
+    rows = []
+    for params, value in entries:
+        key = make_key(endpoint, params)
+        _memory.set(key, value, ttl=ttl)
+        rows.append((key, expires_at, value))
+    if CACHE_DB_PATH:
+        try:
+            await asyncio.to_thread(_disk_set_many, rows)
+        except sqlite3.Error as e:
+            print(f"Cache write failed: {e}")
+
+
+async def cache_get(endpoint, params):
+    return (await cache_get_many(endpoint, [params]))[0]
+
+
+async def cache_set(endpoint, params, value):
+    await cache_set_many(endpoint, [(params, value)])
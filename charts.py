@@ -0,0 +1,143 @@
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.ticker import PercentFormatter, FuncFormatter
+import seaborn as sns
+from wordcloud import WordCloud
+import base64
+import io
+
+# Imported by renderer jobs only, so these global styles stay out of the web workers.
+matplotlib.use('Agg')
+sns.set()
+matplotlib.rcParams['font.family'] = 'DejaVu Sans'
+
+SENTIMENT_COLORS = ['#28a745', '#dc3545', '#bfbfbf']
+
+
+def _to_base64(fig, format='png'):
+    img = io.BytesIO()
+    fig.savefig(img, format=format)
+    return base64.b64encode(img.getvalue()).decode('utf8')
+
+
+def _white_axes(ax):
+    # What sns.axes_style('white') changes from the default darkgrid, set on the Axes itself: the context
+    # manager swaps global rcParams, which jobs rendering in threads (RENDER_WORKERS=0) would see.
+    ax.set_facecolor('white')
+    ax.grid(False)
+    for spine in ax.spines.values():
+        spine.set_edgecolor('.15')
+
+
+def render_combined(df, plot_type='total'):
+    df = df.copy()
+    if len(df) <= 20:
+        fig = Figure(figsize=(12, 8))
+        bottom_margin = 0.25 + 0.07 * (len(df) // 5)
+    elif len(df) <= 40:
+        fig = Figure(figsize=(14, 10))
+        bottom_margin = 0.17 + 0.05 * (len(df) // 5)
+    else:
+        fig = Figure(figsize=(18, 14))
+        bottom_margin = min(0.1 + 0.05 * (len(df) // 5), 0.6)
+    ax = fig.subplots()
+    _white_axes(ax)
+
+    colors = ['#03045e','#023e8a','#0077b6','#0096c7','#00b4d8','#48cae4','#90e0ef','#ade8f4']
+
+    if plot_type == 'total':
+        ax.bar(df.index + 1, df['Views'], color=colors)
+        ax2 = ax.twinx()
+        _white_axes(ax2)
+        ax2.plot(df.index + 1, df['Likes'], color='crimson', marker='D')
+        ax2.set_ylabel('Likes', fontsize=13, fontweight='bold')
+        ax2.yaxis.set_major_formatter(FuncFormatter(lambda x, _: f'{int(x):,}'))
+        ax.set_ylabel('Views', fontsize=13, fontweight='bold')
+        ax.set_title('Views and Likes Graph', fontsize=16, fontweight='bold')
+
+    elif plot_type == 'engagement_rate':
+        df['engagement_rate'] = ((df['Likes'] + df['Comments']) / df['Views'].where(df['Views'] > 0)).fillna(0.0)
+        ax.bar(df.index + 1, df['engagement_rate'], color=colors)
+        ax.yaxis.set_major_formatter(PercentFormatter(xmax=1.0))
+        ax.set_ylim(0, df['engagement_rate'].max() * 1.1)
+        ax.set_ylabel('Engagement Rate (%)', fontsize=13, fontweight='bold')
+        ax.set_title('Engagement Rate by Video', fontsize=16, fontweight='bold')
+
+    elif plot_type == 'composite_score':
+        df['engagement_rate'] = ((df['Likes'] + df['Comments']) / df['Views'].where(df['Views'] > 0)).fillna(0.0)
+        df['composite_score'] = (df['Views'] * 0.4) + (df['Likes'] * 0.2) + (df['Comments'] * 0.2) + (df['engagement_rate'] * 0.1) + (df['Subscribers'] * 0.1)
+        ax.bar(df.index + 1, df['composite_score'], color=colors)
+        ax.set_ylabel('Composite Score', fontsize=13, fontweight='bold')
+        ax.set_title('Composite Score by Video', fontsize=16, fontweight='bold')
+
+    else:
+        raise ValueError("Invalid plot_type. Use 'total', 'engagement_rate', or 'composite_score'.")
+
+    while len(colors) < len(df):
+        colors.extend(colors)
+
+    handles = [Line2D([0], [0], color=c, marker='o', label=f"{num}: {name}", markersize=10, linestyle='None')
+               for num, name, c in zip(df.index + 1, df['Title'], colors)]
+
+    legend = ax.legend(handles=handles, title='Title Mapping', loc='upper center', bbox_to_anchor=(0.5, -0.15), ncol=2,
+                       facecolor='white')
+    legend.get_title().set_fontsize(13)
+    legend.get_title().set_fontweight('bold')
+
+    ax.set_xlabel('Title Number', fontsize=13, fontweight='bold')
+    ax.set_xticks(range(1, len(df) + 1))
+    ax.set_xticklabels(range(1, len(df) + 1))
+    if plot_type == 'total' or plot_type == 'composite_score':
+        ax.yaxis.set_major_formatter(FuncFormatter(lambda x, _: f'{int(x):,}'))
+    else:
+        ax.yaxis.set_major_formatter(FuncFormatter(lambda x, _: f'{x:.2%}'))
+
+    if len(df) > 40:
+        fig.tight_layout()
+
+    fig.subplots_adjust(bottom=bottom_margin)
+
+    for text in legend.get_texts():
+        text.set_fontsize(10)
+    legend.get_frame().set_linewidth(0.5)
+
+    return _to_base64(fig)
+
+
+def render_sentiment(df, type='multiple'):
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    if type == 'multiple':
+        # Stacked bar chart for multiple videos
+        df.plot(kind='bar', stacked=True, ax=ax, color=SENTIMENT_COLORS)
+        ax.set_title('Sentiment Analysis for Multiple Videos')
+        ax.set_xlabel('Video Index')
+        ax.set_ylabel('Number of Comments')
+        ax.set_xticks(range(len(df)))
+        ax.set_xticklabels([i + 1 for i in range(len(df))], rotation=0)
+        ax.legend(['Positive', 'Negative', 'Neutral'])
+    elif type == 'single':
+        # Non-stacked bar chart for a single video (different bars for each sentiment)
+        series = df.iloc[0]
+        series.plot(kind='bar', ax=ax, color=SENTIMENT_COLORS)
+        ax.set_title('Sentiment Analysis for a Single Video')
+        ax.set_ylabel('Number of Comments')
+        ax.tick_params(axis='x', labelrotation=0)
+    fig.tight_layout()
+    return _to_base64(fig)
+
+
+def render_wordcloud(frequencies, width=800, height=400, layout_scale=1, image_format='png'):
+    # Terms are counted and stopword-filtered by text_stats before they get here. The layout is
+    # searched on a canvas layout_scale times smaller and drawn at full size, which is most of the speedup.
+    wordcloud = WordCloud(width=max(1, width // layout_scale), height=max(1, height // layout_scale), scale=layout_scale,
+                          max_words=len(frequencies), background_color='white').generate_from_frequencies(frequencies)
+    # Word clouds use few colours; a 128-colour palette keeps the antialiased edges at about a quarter of the RGB size.
+    image = wordcloud.to_image().quantize(colors=128)
+    img = io.BytesIO()
+    if image_format == 'webp':
+        image.convert('RGB').save(img, format='WEBP', lossless=True, method=4)
+    else:
+        image.save(img, format='PNG')
+    return base64.b64encode(img.getvalue()).decode('utf8')
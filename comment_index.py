@@ -0,0 +1,152 @@
+from sentiment_client import score_texts, SENTIMENT_LABELS
+from text_stats import term_counts
+from metrics import timed
+from sqlite_store import sqlite_connection
+import asyncio
+import os
+import time
+
+COMMENT_INDEX_DB_PATH = os.getenv('COMMENT_INDEX_DB_PATH', 'comments.sqlite3')
+COMMENT_INDEX_MAX_NEW = int(os.getenv('COMMENT_INDEX_MAX_NEW', 500))
+COMMENT_INDEX_REFRESH = float(os.getenv('COMMENT_INDEX_REFRESH', 60))
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS videos (video_id TEXT PRIMARY KEY, watermark TEXT, comments INTEGER, refreshed_at REAL)",
+    # text is only kept until the comment has a sentiment label.
+    "CREATE TABLE IF NOT EXISTS comments (video_id TEXT, comment_id TEXT, published_at TEXT, "
+    "text TEXT, label TEXT, PRIMARY KEY (video_id, comment_id))",
+    "CREATE TABLE IF NOT EXISTS sentiment (video_id TEXT, label TEXT, count INTEGER, PRIMARY KEY (video_id, label))",
+    "CREATE TABLE IF NOT EXISTS terms (video_id TEXT, term TEXT, count INTEGER, PRIMARY KEY (video_id, term))",
+    "CREATE INDEX IF NOT EXISTS terms_by_count ON terms (video_id, count DESC)",
+    # A time-ordered walk that ran out of budget before reaching the watermark leaves a gap. The next refresh
+    # continues from page_token, and videos.watermark moves to this row's watermark once the gap is filled.
+    "CREATE TABLE IF NOT EXISTS backfill (video_id TEXT PRIMARY KEY, page_token TEXT, watermark TEXT)",
+)
+
+
+def _connection():
+    return sqlite_connection(COMMENT_INDEX_DB_PATH, *SCHEMA)
+
+
+def comment_published(item):
+    return item["snippet"]["topLevelComment"]["snippet"].get("publishedAt", "")
+
+
+def _watermark(video_id):
+    conn = _connection()
+    row = conn.execute("SELECT watermark, refreshed_at FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+    backfill = conn.execute("SELECT page_token, watermark FROM backfill WHERE video_id = ?", (video_id,)).fetchone()
+    return ((row[0] or None), row[1] or 0, backfill) if row else (None, 0, backfill)
+
+
+def _record(video_id, items, time_items, resume_token, backfill):
+    conn = _connection()
+    new_texts = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        seen = set()
+        for item in items + (time_items or []):
+            comment_id = item["id"]
+            if comment_id in seen:
+                continue
+            seen.add(comment_id)
+            text = item["snippet"]["topLevelComment"]["snippet"]["textOriginal"]
+            cursor = conn.execute("INSERT OR IGNORE INTO comments (video_id, comment_id, published_at, text) VALUES (?, ?, ?, ?)",
+                                  (video_id, comment_id, comment_published(item), text))
+            if cursor.rowcount == 1:
+                new_texts.append(text)
+        conn.executemany("INSERT INTO terms (video_id, term, count) VALUES (?, ?, ?) "
+                         "ON CONFLICT (video_id, term) DO UPDATE SET count = count + excluded.count",
+                         [(video_id, term, count) for term, count in term_counts(new_texts).items()])
+        # Only a time-ordered walk that got all the way back to the old watermark moves it; relevance
+        # pages can skip over newer comments, and a capped walk leaves a gap that is backfilled first.
+        watermark, refreshed_at = '', 0
+        if time_items is None:
+            # A failed walk changes nothing, except that a failed resume starts over from the newest comment.
+            if backfill:
+                conn.execute("DELETE FROM backfill WHERE video_id = ?", (video_id,))
+        else:
+            pending = backfill[1] if backfill else max((comment_published(item) for item in time_items), default='')
+            refreshed_at = time.time()
+            if resume_token is None:
+                watermark = pending
+                conn.execute("DELETE FROM backfill WHERE video_id = ?", (video_id,))
+            else:
+                conn.execute("INSERT OR REPLACE INTO backfill (video_id, page_token, watermark) VALUES (?, ?, ?)",
+                             (video_id, resume_token, pending))
+        total = conn.execute(
+            "INSERT INTO videos (video_id, watermark, comments, refreshed_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (video_id) DO UPDATE SET watermark = max(watermark, excluded.watermark), "
+            "comments = comments + excluded.comments, refreshed_at = max(refreshed_at, excluded.refreshed_at) RETURNING comments",
+            (video_id, watermark, len(new_texts), refreshed_at)).fetchone()[0]
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return {'new': len(new_texts), 'total': total}
+
+
+def _pending(video_id):
+    return _connection().execute("SELECT comment_id, text FROM comments WHERE video_id = ? AND label IS NULL",
+                                 (video_id,)).fetchall()
+
+
+def _apply_labels(video_id, labelled):
+    conn = _connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for comment_id, label in labelled:
+            # Another worker may have labelled the comment first; only the first update counts.
+            cursor = conn.execute("UPDATE comments SET label = ?, text = NULL WHERE video_id = ? AND comment_id = ? AND label IS NULL",
+                                  (label, video_id, comment_id))
+            if cursor.rowcount == 1:
+                conn.execute("INSERT INTO sentiment (video_id, label, count) VALUES (?, ?, 1) "
+                             "ON CONFLICT (video_id, label) DO UPDATE SET count = count + 1", (video_id, label))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _totals(video_id):
+    counts = dict(_connection().execute("SELECT label, count FROM sentiment WHERE video_id = ?", (video_id,)).fetchall())
+    return {label: counts.get(label, 0) for label in SENTIMENT_LABELS}
+
+
+def _top_terms(video_id, limit):
+    return dict(_connection().execute("SELECT term, count FROM terms WHERE video_id = ? ORDER BY count DESC LIMIT ?",
+                                      (video_id, limit)).fetchall())
+
+
+async def comment_watermark(video_id):
+    # (watermark, refreshed_at, backfill): the publishedAt down to which every newer comment is indexed
+    # (None before the first time-ordered fetch), when time-ordered comments were last fetched, and the
+    # (page_token, watermark) of an unfinished gap, if any.
+    return await asyncio.to_thread(_watermark, video_id)
+
+
+def needs_refresh(refreshed_at):
+    return time.time() - refreshed_at >= COMMENT_INDEX_REFRESH
+
+
+async def record_comments(video_id, items, time_items=None, resume_token=None, backfill=None):
+    # Adds unseen commentThreads items and their term counts; returns {'new', 'total'} comment counts.
+    # time_items is None when no time-ordered walk was made or one of its pages failed; resume_token and
+    # backfill are what fetch_new_comments returned and the stored gap the walk continued, if any.
+    with timed('store_seconds', op='comments'):
+        return await asyncio.to_thread(_record, video_id, list(items or []), time_items, resume_token, backfill)
+
+
+async def tracked_sentiment(video_id):
+    # Scores only comments without a label yet and returns the running totals for the video.
+    pending = await asyncio.to_thread(_pending, video_id)
+    if pending:
+        labels = await score_texts([text for _, text in pending])
+        labelled = [(comment_id, label) for (comment_id, _), label in zip(pending, labels) if label is not None]
+        if labelled:
+            await asyncio.to_thread(_apply_labels, video_id, labelled)
+    return await asyncio.to_thread(_totals, video_id)
+
+
+async def top_terms(video_id, limit):
+    return await asyncio.to_thread(_top_terms, video_id, limit)
@@ -0,0 +1,22 @@
+import asyncio
+import os
+
+FANOUT_CONCURRENCY = int(os.getenv('FANOUT_CONCURRENCY', 10))
+FANOUT_TASK_TIMEOUT = float(os.getenv('FANOUT_TASK_TIMEOUT', 15))
+
+async def _run_one(semaphore, coro, timeout, default):
+    async with semaphore:
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            print(f"Task timed out after {timeout}s")
+            return default
+        except Exception as e:
+            print(f"Task failed: {e}")
+            return default
+
+async def run_bounded(coros, limit=None, timeout=None, default=None):
+    # Results come back in the same order as `coros`; a failed or timed out task yields `default`.
+    semaphore = asyncio.Semaphore(limit or FANOUT_CONCURRENCY)
+    timeout = FANOUT_TASK_TIMEOUT if timeout is None else timeout
+    return await asyncio.gather(*(_run_one(semaphore, coro, timeout, default) for coro in coros))
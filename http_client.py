@@ -0,0 +1,46 @@
+import aiohttp
+import os
+
+HTTP_TOTAL_TIMEOUT = float(os.getenv('HTTP_TOTAL_TIMEOUT', 30))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 20))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 100))
+HTTP_POOL_PER_HOST = int(os.getenv('HTTP_POOL_PER_HOST', 20))
+HTTP_DNS_TTL = int(os.getenv('HTTP_DNS_TTL', 300))
+HTTP_KEEPALIVE = float(os.getenv('HTTP_KEEPALIVE', 60))
+
+_session = None
+
+def _build_session():
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_SIZE,
+        limit_per_host=HTTP_POOL_PER_HOST,
+        ttl_dns_cache=HTTP_DNS_TTL,
+        use_dns_cache=True,
+        keepalive_timeout=HTTP_KEEPALIVE,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=HTTP_TOTAL_TIMEOUT,
+        sock_connect=HTTP_CONNECT_TIMEOUT,
+        sock_read=HTTP_READ_TIMEOUT,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, raise_for_status=False)
+
+async def start_session():
+    global _session
+    if _session is None or _session.closed:
+        _session = _build_session()
+    return _session
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+def get_session():
+    # Created in the app's startup hook; scripts that skip the hook get one lazily.
+    global _session
+    if _session is None or _session.closed:
+        _session = _build_session()
+    return _session
@@ -0,0 +1,51 @@
+import asyncio
+import os
+
+JOBS_MAX_CONCURRENCY = int(os.getenv('JOBS_MAX_CONCURRENCY', 4))
+JOBS_COLLECT_TIMEOUT = float(os.getenv('JOBS_COLLECT_TIMEOUT', 120))
+
+_jobs = {}
+_slots = asyncio.Semaphore(JOBS_MAX_CONCURRENCY)
+
+
+async def _run(factory):
+    async with _slots:
+        return await factory()
+
+
+def _retrieve(task):
+    # Failures surface when the job is collected; this keeps uncollected ones from logging as unhandled.
+    if not task.cancelled():
+        task.exception()
+
+
+def _expire(key):
+    job = _jobs.pop(key, None)
+    if job is not None:
+        job[0].cancel()
+
+
+def schedule(token, name, factory):
+    # Starts follow-up work for a stored result set before the browser asks for it.
+    key = (token, name)
+    task = asyncio.ensure_future(_run(factory))
+    task.add_done_callback(_retrieve)
+    timer = asyncio.get_running_loop().call_later(JOBS_COLLECT_TIMEOUT, _expire, key)
+    _jobs[key] = (task, timer)
+
+
+async def collect(token, name, factory):
+    # Awaits the precomputed job if this worker scheduled one, otherwise computes inline.
+    job = _jobs.pop((token, name), None)
+    if job is None:
+        return await factory()
+    task, timer = job
+    timer.cancel()
+    return await task
+
+
+def cancel_all():
+    for task, timer in _jobs.values():
+        timer.cancel()
+        task.cancel()
+    _jobs.clear()
@@ -0,0 +1,160 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import bisect
+import os
+import sys
+import threading
+import time
+
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PROFILE_ENABLED = os.getenv('PROFILE_ENABLED', '0') == '1'
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.005))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+HELP = {
+    'http_request_seconds': 'Time to produce a response, by route and status.',
+    'youtube_request_seconds': 'Outbound YouTube Data API calls, by endpoint and status.',
+    'pipeline_stage_seconds': 'Phases of the search and video pipelines.',
+    'render_seconds': 'Chart and word cloud jobs, by job and cache result.',
+    'sentiment_request_seconds': 'Calls to the sentiment model API.',
+    'sentiment_comments_total': 'Comments sent to the sentiment model API.',
+    'store_seconds': 'Result store reads and writes.',
+    'template_seconds': 'HTML template rendering.',
+    'youtube_cache_total': 'API response cache lookups, by endpoint and result.',
+    'youtube_quota_used_units': 'Quota units charged today, by hashed API key.',
+}
+
+_counters = defaultdict(float)
+_histograms = {}
+_timings = ContextVar('server_timings', default=None)
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    _counters[(name, _labels(labels))] += value
+
+
+def observe(name, seconds, **labels):
+    key = (name, _labels(labels))
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = [[0] * len(METRICS_BUCKETS), 0.0, 0]
+    index = bisect.bisect_left(METRICS_BUCKETS, seconds)
+    if index < len(METRICS_BUCKETS):
+        histogram[0][index] += 1
+    histogram[1] += seconds
+    histogram[2] += 1
+    timings = _timings.get()
+    if timings is not None:
+        stage = labels.get('stage') or labels.get('endpoint') or labels.get('job') or labels.get('op')
+        timings.append((f"{name.replace('_seconds', '')}-{stage}" if stage else name.replace('_seconds', ''), seconds))
+
+
+@contextmanager
+def timed(name, **labels):
+    # Records into a histogram and into the Server-Timing header of the current request.
+    started = time.perf_counter()
+    try:
+        yield labels
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def start_request():
+    return _timings.set([])
+
+
+def server_timing(total=None):
+    # Repeated stages (e.g. parallel API calls) are summed, so entries can add up to more than the total.
+    durations = defaultdict(float)
+    calls = Counter()
+    for stage, seconds in _timings.get() or []:
+        durations[stage] += seconds
+        calls[stage] += 1
+    entries = [f'{stage};desc="{calls[stage]}x";dur={seconds * 1000:.1f}' for stage, seconds in durations.items()]
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = [(key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for key, value in pairs]
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def render_metrics(extra=()):
+    # Prometheus text exposition format. Each worker process keeps its own numbers.
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(_counters.items()):
+        header(name, 'counter')
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), (buckets, total, count) in sorted(_histograms.items()):
+        header(name, 'histogram')
+        cumulative = 0
+        for bound, bucket in zip(METRICS_BUCKETS, buckets):
+            cumulative += bucket
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', f'{bound:g}')])} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    for name, kind, labels, value in extra:
+        header(name, kind)
+        lines.append(f"{name}{_format_labels(_labels(labels))} {value:g}")
+    return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    # Samples the event loop thread's stack from a helper thread and counts collapsed stacks
+    # (flamegraph.pl / speedscope format). Other requests sharing the loop show up too.
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def save(self, name):
+        self.stop()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{name}.folded")
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
@@ -0,0 +1,61 @@
+# pandas is imported inside the functions so web workers only load it once a table is built.
+COLUMNS = ['Title', 'Channel', 'Subscribers', 'Views', 'Likes', 'Likes(%)', 'Duration', 'Upload_date', 'Comments', 'Video_link']
+DURATION_PATTERN = (r'^P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?'
+                    r'(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$')
+DURATION_SECONDS = {'weeks': 604800, 'days': 86400, 'hours': 3600, 'minutes': 60, 'seconds': 1}
+
+
+def _counts(values):
+    import pandas as pd
+    return pd.to_numeric(pd.Series(values, dtype='object'), errors='coerce').fillna(0)
+
+
+def parse_durations(durations):
+    # ISO-8601 durations (e.g. PT1H2M3S) to HH:MM:SS; hours keep counting past a day, as before.
+    parts = durations.str.extract(DURATION_PATTERN).astype(float).fillna(0)
+    total = sum(parts[unit] * seconds for unit, seconds in DURATION_SECONDS.items()).astype('int64')
+    hours = (total // 3600).astype(str).str.zfill(2)
+    minutes = (total % 3600 // 60).astype(str).str.zfill(2)
+    seconds = (total % 60).astype(str).str.zfill(2)
+    return hours + ':' + minutes + ':' + seconds
+
+
+def normalize_videos(videos, channels):
+    # Raw videos.list items plus {channelId: statistics} to the typed results table, built column-wise.
+    # Titles stay plain text here; link_titles turns them into the HTML links shown in the table.
+    import pandas as pd
+    videos = [video for video in videos if video and 'snippet' in video]
+    if not videos:
+        return pd.DataFrame(columns=COLUMNS)
+    snippets = [video['snippet'] for video in videos]
+    statistics = [video.get('statistics', {}) for video in videos]
+    ids = pd.Series([video['id'] for video in videos], dtype='object')
+
+    views = _counts([stats.get('viewCount') for stats in statistics]).astype('int64')
+    likes = _counts([stats.get('likeCount') for stats in statistics]).astype('int64')
+    df = pd.DataFrame({
+        'Title': [snippet.get('title', '') for snippet in snippets],
+        'Channel': pd.Categorical([snippet.get('channelTitle', '') for snippet in snippets]),
+        'Subscribers': _counts([channels.get(snippet.get('channelId'), {}).get('subscriberCount') for snippet in snippets]).astype('int64'),
+        'Views': views,
+        'Likes': likes,
+        'Likes(%)': (likes / views.where(views > 0)).fillna(0.0) * 100,
+        'Duration': parse_durations(pd.Series([video.get('contentDetails', {}).get('duration', 'PT0S') for video in videos], dtype='object')),
+        'Upload_date': pd.to_datetime(pd.Series([snippet.get('publishedAt', '') for snippet in snippets], dtype='object').str[:10], errors='coerce'),
+        'Comments': _counts([stats.get('commentCount') for stats in statistics]).astype('int64'),
+        'Video_link': 'https://www.youtube.com/watch?v=' + ids,
+    })
+    return df[COLUMNS]
+
+
+def to_records(df):
+    # Plain Python values for JSON: ints instead of numpy scalars, channel names as str, dates as YYYY-MM-DD.
+    df = df.astype({'Channel': str, 'Subscribers': object, 'Views': object, 'Likes': object, 'Comments': object})
+    df['Upload_date'] = df['Upload_date'].dt.strftime('%Y-%m-%d').fillna('N/A')
+    return df.to_dict('records')
+
+
+def link_titles(df):
+    df = df.copy()
+    df['Title'] = '<a href="' + df['Video_link'] + '" target="_blank">' + df['Title'] + '</a>'
+    return df
@@ -0,0 +1,176 @@
+from datetime import datetime, timedelta, timezone
+from sqlite_store import sqlite_connection
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import time
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+except Exception:
+    QUOTA_TIMEZONE = timezone(timedelta(hours=-8))
+
+QUOTA_COSTS = {'search': 100, 'videos': 1, 'channels': 1, 'commentThreads': 1}
+QUOTA_DAILY_LIMIT = int(os.getenv('QUOTA_DAILY_LIMIT', 10000))
+QUOTA_SEARCH_RESERVE = int(os.getenv('QUOTA_SEARCH_RESERVE', 500))
+QUOTA_UNITS_PER_SECOND = float(os.getenv('QUOTA_UNITS_PER_SECOND', 20))
+QUOTA_BURST = float(os.getenv('QUOTA_BURST', 400))
+QUOTA_DB_PATH = os.getenv('QUOTA_DB_PATH', 'quota.sqlite3')
+YOUTUBE_MAX_RETRIES = int(os.getenv('YOUTUBE_MAX_RETRIES', 3))
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', 0.5))
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', 8))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RETRYABLE_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'backendError'}
+QUOTA_REASONS = {'quotaExceeded', 'dailyLimitExceeded'}
+
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def _load_keys():
+    keys = [key.strip() for key in os.getenv('YOUTUBE_API_KEYS', '').split(',') if key.strip()]
+    keys += [os.getenv('YOUTUBE_VID_API_KEY'), os.getenv('YOUTUBE_COM_API_KEY')]
+    return list(dict.fromkeys(key for key in keys if key))
+
+
+class KeyState:
+    def __init__(self, key):
+        self.key = key
+        # Only this hash is ever written to disk or logs.
+        self.key_id = hashlib.sha256(key.encode()).hexdigest()[:12]
+        self.tokens = QUOTA_BURST
+        self.updated = time.monotonic()
+        self.used = 0
+        self.day = None
+        self.exhausted_day = None
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(QUOTA_BURST, self.tokens + (now - self.updated) * QUOTA_UNITS_PER_SECOND)
+        self.updated = now
+
+
+_keys = [KeyState(key) for key in _load_keys()]
+_next_key = 0
+_lock = asyncio.Lock()
+
+
+def quota_day():
+    # The YouTube Data API resets quotas at midnight Pacific time.
+    return datetime.now(QUOTA_TIMEZONE).date().isoformat()
+
+
+def _connection():
+    return sqlite_connection(QUOTA_DB_PATH, "CREATE TABLE IF NOT EXISTS usage (key_id TEXT, day TEXT, used INTEGER, PRIMARY KEY (key_id, day))")
+
+
+def _disk_charge(key_id, day, cost):
+    row = _connection().execute(
+        "INSERT INTO usage (key_id, day, used) VALUES (?, ?, ?) "
+        "ON CONFLICT (key_id, day) DO UPDATE SET used = used + excluded.used RETURNING used",
+        (key_id, day, cost)).fetchone()
+    return row[0]
+
+
+def _disk_used(key_ids, day):
+    marks = ','.join('?' * len(key_ids))
+    return dict(_connection().execute(f"SELECT key_id, used FROM usage WHERE day = ? AND key_id IN ({marks})",
+                                      (day, *key_ids)).fetchall())
+
+
+async def _sync_day(day):
+    # Loads each key's usage for a new quota day before _lock is taken, so no disk read happens under it.
+    stale = [state for state in _keys if state.day != day]
+    if not stale:
+        return
+    used = await asyncio.to_thread(_disk_used, [state.key_id for state in stale], day) if QUOTA_DB_PATH else {}
+    for state in stale:
+        if state.day != day:
+            state.day = day
+            state.used = used.get(state.key_id, 0)
+
+
+def _pick_key(day, cost, limit):
+    # Round-robin over keys with daily quota left, preferring one whose bucket covers the call right now.
+    global _next_key
+    candidates = []
+    for offset in range(len(_keys)):
+        state = _keys[(_next_key + offset) % len(_keys)]
+        if state.exhausted_day == day or state.day != day or state.used + cost > limit:
+            continue
+        state.refill()
+        if state.tokens >= cost:
+            _next_key = (_next_key + offset + 1) % len(_keys)
+            return state
+        candidates.append((offset, state))
+    if not candidates:
+        return None
+    offset, state = max(candidates, key=lambda candidate: candidate[1].tokens)
+    _next_key = (_next_key + offset + 1) % len(_keys)
+    return state
+
+
+async def acquire_key(endpoint):
+    # Reserves quota on a key under _lock, then waits outside it until the key's token bucket covers the call.
+    if not _keys:
+        raise QuotaExceeded("No YouTube API keys configured.")
+    cost = QUOTA_COSTS.get(endpoint, 1)
+    # Expensive calls stop early so cheap list calls can still be served on the remaining budget.
+    limit = QUOTA_DAILY_LIMIT - (QUOTA_SEARCH_RESERVE if cost > 1 else 0)
+    day = quota_day()
+    await _sync_day(day)
+    async with _lock:
+        state = _pick_key(day, cost, limit)
+        if state is None:
+            raise QuotaExceeded("YouTube API quota is exhausted for today. Please try again later.")
+        # The balance may go negative; later callers then see the key as busy until it refills.
+        state.tokens -= cost
+        state.used += cost
+        wait = -state.tokens / QUOTA_UNITS_PER_SECOND
+    if wait > 0:
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            state.tokens += cost
+            state.used -= cost
+            raise
+    if QUOTA_DB_PATH:
+        try:
+            state.used = await asyncio.to_thread(_disk_charge, state.key_id, day, cost)
+        except sqlite3.Error as e:
+            print(f"Quota write failed: {e}")
+    return state.key
+
+
+def mark_exhausted(key):
+    for state in _keys:
+        if state.key == key:
+            state.exhausted_day = quota_day()
+            print(f"YouTube API key {state.key_id} ran out of quota; rotating to the next key")
+
+
+def error_reason(body):
+    try:
+        errors = json.loads(body).get('error', {}).get('errors', [])
+        return errors[0].get('reason') if errors else None
+    except (ValueError, AttributeError):
+        return None
+
+
+def is_retryable(status, reason):
+    return status in RETRYABLE_STATUSES or reason in RETRYABLE_REASONS
+
+
+def backoff_delay(attempt):
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def quota_usage():
+    return {state.key_id: {'day': state.day, 'used': state.used} for state in _keys}
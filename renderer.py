@@ -0,0 +1,156 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from cache import LRUCache
+from metrics import timed
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', 2))
+RENDER_MAX_QUEUE = int(os.getenv('RENDER_MAX_QUEUE', 16))
+RENDER_CACHE_ITEMS = int(os.getenv('RENDER_CACHE_ITEMS', 256))
+RENDER_CACHE_DIR = os.getenv('RENDER_CACHE_DIR', '')
+
+_pool = None
+_queued = 0
+_rendered = LRUCache(RENDER_CACHE_ITEMS)
+_rendering = {}
+
+
+class RenderQueueFull(Exception):
+    pass
+
+
+def _warm_worker():
+    import charts  # noqa: F401
+
+
+def _ready():
+    return os.getpid()
+
+
+def _run_job(name, args):
+    import charts
+    return getattr(charts, name)(*args)
+
+
+def start_renderer():
+    global _pool
+    if RENDER_WORKERS <= 0 or _pool is not None:
+        return
+    # spawn keeps the event loop, sockets and threads of the web worker out of the children.
+    _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS,
+                                mp_context=multiprocessing.get_context('spawn'),
+                                initializer=_warm_worker)
+    for _ in range(RENDER_WORKERS):
+        _pool.submit(_ready)
+
+
+def stop_renderer():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _feed(digest, value):
+    kind = type(value).__name__
+    if kind in ('DataFrame', 'Series'):
+        import pandas as pd
+        frame = value.to_frame() if kind == 'Series' else value
+        digest.update(repr((kind, list(frame.columns), [str(t) for t in frame.dtypes])).encode())
+        digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    else:
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode())
+
+
+def content_key(name, *args):
+    digest = hashlib.sha256(name.encode())
+    for arg in args:
+        _feed(digest, arg)
+    return digest.hexdigest()
+
+
+def _disk_path(key):
+    return os.path.join(RENDER_CACHE_DIR, f"{key}.b64")
+
+
+def _disk_get(key):
+    try:
+        with open(_disk_path(key)) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _disk_set(key, value):
+    os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{_disk_path(key)}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(value)
+    os.replace(tmp_path, _disk_path(key))
+
+
+async def _render_job(name, args):
+    # With RENDER_WORKERS=0 jobs run in threads. That is safe because charts draws on its own Figure objects
+    # and styles each Axes directly; global rcParams are only set once, when charts is imported.
+    global _queued
+    if _queued >= RENDER_MAX_QUEUE:
+        raise RenderQueueFull(f"Renderer busy: {_queued} jobs queued")
+    _queued += 1
+    try:
+        if RENDER_WORKERS <= 0:
+            return await asyncio.to_thread(_run_job, name, args)
+        if _pool is None:
+            start_renderer()
+        pool = _pool
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, _run_job, name, args)
+        except BrokenProcessPool:
+            # A worker died (OOM kill, segfault) and took the pool with it; replace it once and retry.
+            # Concurrent jobs that failed on the same pool restart it only once.
+            print(f"Render pool broke during {name}; restarting it")
+            if _pool is pool:
+                stop_renderer()
+                start_renderer()
+            return await asyncio.get_running_loop().run_in_executor(_pool, _run_job, name, args)
+    finally:
+        _queued -= 1
+
+
+async def _render_and_store(key, name, args):
+    try:
+        value = await _render_job(name, args)
+        _rendered.set(key, value)
+        if RENDER_CACHE_DIR:
+            try:
+                await asyncio.to_thread(_disk_set, key, value)
+            except OSError as e:
+                print(f"Render cache write failed: {e}")
+        return value
+    finally:
+        _rendering.pop(key, None)
+
+
+async def render(name, *args):
+    # Jobs are looked up by name in charts, so only the pool processes import the plotting stack.
+    # Output is cached by a hash of the job name and its input data; identical concurrent jobs share one render.
+    with timed('render_seconds', job=name) as labels:
+        key = content_key(name, *args)
+        value = _rendered.get(key)
+        labels['cache'] = 'memory'
+        if value is not None:
+            return value
+        if RENDER_CACHE_DIR:
+            value = await asyncio.to_thread(_disk_get, key)
+            labels['cache'] = 'disk'
+            if value is not None:
+                _rendered.set(key, value)
+                return value
+        task = _rendering.get(key)
+        labels['cache'] = 'shared' if task is not None else 'miss'
+        if task is None:
+            task = _rendering[key] = asyncio.ensure_future(_render_and_store(key, name, args))
+        return await asyncio.shield(task)
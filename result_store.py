@@ -0,0 +1,74 @@
+from cache import LRUCache
+from metrics import timed
+from sqlite_store import sqlite_connection, purge_expired
+import asyncio
+import os
+import pickle
+import secrets
+import sqlite3
+import time
+
+RESULT_DB_PATH = os.getenv('RESULT_DB_PATH', 'results.sqlite3')
+RESULT_TTL = int(os.getenv('RESULT_TTL', 3600))
+RESULT_MEMORY_ITEMS = int(os.getenv('RESULT_MEMORY_ITEMS', 256))
+
+_memory = LRUCache(RESULT_MEMORY_ITEMS)
+
+
+def _connection():
+    return sqlite_connection(RESULT_DB_PATH, "CREATE TABLE IF NOT EXISTS results (token TEXT PRIMARY KEY, expires_at REAL, data BLOB)")
+
+
+def _disk_put(token, expires_at, blob):
+    conn = _connection()
+    conn.execute("INSERT OR REPLACE INTO results (token, expires_at, data) VALUES (?, ?, ?)", (token, expires_at, blob))
+    purge_expired(conn, 'results', 0.05)
+
+
+def _disk_get(token):
+    row = _connection().execute("SELECT expires_at, data FROM results WHERE token = ?", (token,)).fetchone()
+    if row is None or row[0] < time.time():
+        return None
+    return row
+
+
+def _dumps(data):
+    # DataFrames pickle block-wise, so this stays columnar without extra dependencies.
+    return pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+async def put_result(data):
+    token = secrets.token_urlsafe(16)
+    with timed('store_seconds', op='put'):
+        blob = await asyncio.to_thread(_dumps, data)
+        _memory.set(token, blob, ttl=RESULT_TTL)
+        if RESULT_DB_PATH:
+            try:
+                await asyncio.to_thread(_disk_put, token, time.time() + RESULT_TTL, blob)
+            except sqlite3.Error as e:
+                print(f"Result store write failed: {e}")
+    return token
+
+
+async def _load(token):
+    blob = _memory.get(token)
+    if blob is None and RESULT_DB_PATH:
+        try:
+            row = await asyncio.to_thread(_disk_get, token)
+        except sqlite3.Error as e:
+            print(f"Result store read failed: {e}")
+            row = None
+        if row is not None:
+            expires_at, blob = row
+            _memory.set(token, blob, ttl=expires_at - time.time())
+    if blob is None:
+        return None
+    # Every reader gets its own copy, so routes may mutate what they load.
+    return await asyncio.to_thread(pickle.loads, blob)
+
+
+async def get_result(token):
+    if not token:
+        return None
+    with timed('store_seconds', op='get'):
+        return await _load(token)
@@ -0,0 +1,106 @@
+from http_client import get_session
+from cache import LRUCache
+from collections import Counter
+from metrics import timed, inc
+import asyncio
+import hashlib
+import os
+
+API_URL = os.getenv('MODEL_API_URL')
+SENTIMENT_BATCH_SIZE = int(os.getenv('SENTIMENT_BATCH_SIZE', 64))
+SENTIMENT_MAX_IN_FLIGHT = int(os.getenv('SENTIMENT_MAX_IN_FLIGHT', 4))
+SENTIMENT_CACHE_ITEMS = int(os.getenv('SENTIMENT_CACHE_ITEMS', 50000))
+SENTIMENT_CACHE_TTL = int(os.getenv('SENTIMENT_CACHE_TTL', 7 * 24 * 3600))
+SENTIMENT_LABELS = ('Positive', 'Negative', 'Neutral')
+
+_labels = LRUCache(SENTIMENT_CACHE_ITEMS)
+_pending = {}
+_in_flight = asyncio.Semaphore(SENTIMENT_MAX_IN_FLIGHT)
+
+
+async def get_sentiments(comments):
+    session = get_session()
+    try:
+        payload = {"comments": comments}
+        inc('sentiment_comments_total', len(comments))
+        with timed('sentiment_request_seconds') as labels:
+            labels['status'] = 'error'
+            async with session.post(API_URL, json=payload) as response:
+                labels['status'] = response.status
+                if response.status == 200:
+                    data = await response.json()
+                    return data.get("sentiments", [])
+                else:
+                    print(f"Error: Received {response.status} from API")
+                    return []
+    except Exception as e:
+        print(f"Error in get_sentiment_async: {e}")
+        return []
+
+
+def text_key(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+async def _score_batch(batch):
+    async with _in_flight:
+        sentiments = await get_sentiments([text for _, text in batch])
+    if len(sentiments) != len(batch):
+        print(f"Sentiment API returned {len(sentiments)} labels for {len(batch)} comments")
+        sentiments = [None] * len(batch)
+    for (key, _), label in zip(batch, sentiments):
+        if label is not None:
+            _labels.set(key, label, ttl=SENTIMENT_CACHE_TTL)
+        future = _pending.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(label)
+
+
+async def score_texts(texts):
+    keys = [text_key(text) for text in texts]
+    labels = {}
+    waiting = {}
+    to_score = {}
+    for key, text in zip(keys, texts):
+        if key in labels or key in waiting or key in to_score:
+            continue
+        label = _labels.get(key)
+        if label is not None:
+            labels[key] = label
+        elif key in _pending:
+            # Another request is already scoring this text.
+            waiting[key] = _pending[key]
+        else:
+            to_score[key] = text
+    loop = asyncio.get_running_loop()
+    for key in to_score:
+        _pending[key] = loop.create_future()
+    items = list(to_score.items())
+    batches = [items[i:i + SENTIMENT_BATCH_SIZE] for i in range(0, len(items), SENTIMENT_BATCH_SIZE)]
+    try:
+        await asyncio.gather(*(_score_batch(batch) for batch in batches))
+    finally:
+        for key in to_score:
+            future = _pending.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(None)
+    for key in to_score:
+        labels[key] = _labels.get(key)
+    for key, future in waiting.items():
+        labels[key] = await future
+    return [labels.get(key) for key in keys]
+
+
+def _count(labels):
+    sentiment_counts = Counter(labels)
+    return {label: sentiment_counts.get(label, 0) for label in SENTIMENT_LABELS}
+
+
+async def analyze_many(comment_lists):
+    flat = [comment for comments in comment_lists if comments for comment in comments]
+    labels = iter(await score_texts(flat))
+    return [_count([next(labels) for _ in (comments or [])]) for comments in comment_lists]
+
+
+async def analyze_comments(comments):
+    return (await analyze_many([comments]))[0]
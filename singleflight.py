@@ -0,0 +1,72 @@
+from sqlite_store import sqlite_connection
+import asyncio
+import os
+import sqlite3
+import time
+import uuid
+
+SINGLEFLIGHT_DB_PATH = os.getenv('SINGLEFLIGHT_DB_PATH', 'singleflight.sqlite3')
+SINGLEFLIGHT_LEASE = float(os.getenv('SINGLEFLIGHT_LEASE', 30))
+SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv('SINGLEFLIGHT_POLL_INTERVAL', 0.1))
+
+_inflight = {}
+
+
+def flight_key(kind, *parts):
+    normalized = [' '.join(str(part).split()) for part in parts]
+    return '|'.join([kind] + normalized)
+
+
+def _connection():
+    return sqlite_connection(SINGLEFLIGHT_DB_PATH, "CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT, expires_at REAL)")
+
+
+def _try_lease(key, owner):
+    conn = _connection()
+    now = time.time()
+    conn.execute("DELETE FROM leases WHERE key = ? AND expires_at < ?", (key, now))
+    cursor = conn.execute("INSERT OR IGNORE INTO leases (key, owner, expires_at) VALUES (?, ?, ?)",
+                          (key, owner, now + SINGLEFLIGHT_LEASE))
+    return cursor.rowcount == 1
+
+
+def _lease_held(key):
+    row = _connection().execute("SELECT expires_at FROM leases WHERE key = ?", (key,)).fetchone()
+    return row is not None and row[0] >= time.time()
+
+
+def _release(key, owner):
+    _connection().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+
+
+async def _lead(key, factory, shared):
+    owner = None
+    if shared and SINGLEFLIGHT_DB_PATH:
+        try:
+            candidate = f"{os.getpid()}:{uuid.uuid4().hex}"
+            if await asyncio.to_thread(_try_lease, key, candidate):
+                owner = candidate
+            else:
+                # Another worker is running the same pipeline; wait for it so ours hits a warm response cache.
+                deadline = time.monotonic() + SINGLEFLIGHT_LEASE
+                while time.monotonic() < deadline and await asyncio.to_thread(_lease_held, key):
+                    await asyncio.sleep(SINGLEFLIGHT_POLL_INTERVAL)
+        except sqlite3.Error as e:
+            print(f"Single-flight lease failed: {e}")
+    try:
+        return await factory()
+    finally:
+        if owner is not None:
+            try:
+                await asyncio.to_thread(_release, key, owner)
+            except sqlite3.Error as e:
+                print(f"Single-flight release failed: {e}")
+
+
+async def single_flight(key, factory, shared=True):
+    # Concurrent callers with the same key await one shared task; shared=True also coordinates across workers.
+    task = _inflight.get(key)
+    if task is None:
+        task = _inflight[key] = asyncio.ensure_future(_lead(key, factory, shared))
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(task)
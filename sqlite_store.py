@@ -0,0 +1,27 @@
+import random
+import sqlite3
+import threading
+import time
+
+_local = threading.local()
+
+
+def sqlite_connection(path, *ddl):
+    # One autocommit connection per thread (asyncio.to_thread workers) and file. WAL lets other
+    # workers keep reading while one writes; the statements in `ddl` run once per new connection.
+    connections = _local.__dict__.setdefault('connections', {})
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in ddl:
+            conn.execute(statement)
+        connections[path] = conn
+    return conn
+
+
+def purge_expired(conn, table, probability):
+    # Rows past their expires_at are swept on a random fraction of writes, not by a background task.
+    if random.random() < probability:
+        conn.execute(f"DELETE FROM {table} WHERE expires_at < ?", (time.time(),))
@@ -1,51 +1,204 @@
+const PLACEHOLDERS = {
+  total_plot: "total-placeholder",
+  engagement_rate_plot: "engagement-rate-placeholder",
+  composite_score_plot: "composite-score-placeholder",
+  senti_plot: "sentiment-placeholder",
+};
+const TABLE_COLUMNS = ["Title", "Channel", "Subscribers", "Views", "Likes", "Likes(%)", "Duration", "Upload_date", "Comments"];
+const BAR_COLORS = ['#03045e', '#023e8a', '#0077b6', '#0096c7', '#00b4d8', '#48cae4', '#90e0ef', '#ade8f4'];
+const SENTIMENT_LABELS = ['Positive', 'Negative', 'Neutral'];
+const SENTIMENT_COLORS = ['#28a745', '#dc3545', '#bfbfbf'];
+// Draw charts from ?format=data series when Chart.js loaded; otherwise fall back to server-rendered PNGs.
+const CLIENT_CHARTS = typeof window.Chart !== 'undefined';
+
+function showImage(name, image) {
+  const placeholder = document.getElementById(PLACEHOLDERS[name]);
+  if (placeholder && image) {
+    placeholder.src = `data:image/png;base64,${image}`;
+    placeholder.style.opacity = 1;
+  }
+}
+
+function chartCanvas(name) {
+  const placeholder = document.getElementById(PLACEHOLDERS[name]);
+  if (!placeholder) return null;
+  const wrapper = document.createElement('div');
+  wrapper.className = 'chart-canvas';
+  const canvas = document.createElement('canvas');
+  wrapper.appendChild(canvas);
+  placeholder.replaceWith(wrapper);
+  return canvas;
+}
+
+function barChart(name, series, datasets, options = {}) {
+  const canvas = chartCanvas(name);
+  if (!canvas) return;
+  new Chart(canvas, {
+    data: { labels: series.index, datasets },
+    options: {
+      plugins: {
+        tooltip: { callbacks: { title: (items) => series.titles[items[0].dataIndex] } },
+        ...options.plugins,
+      },
+      scales: { x: { title: { display: true, text: 'Title Number' } }, ...options.scales },
+    },
+  });
+}
+
+function drawVideoCharts(series) {
+  barChart('total_plot', series, [
+    { type: 'line', label: 'Likes', data: series.likes, borderColor: 'crimson', backgroundColor: 'crimson', yAxisID: 'likes' },
+    { type: 'bar', label: 'Views', data: series.views, backgroundColor: BAR_COLORS },
+  ], {
+    scales: {
+      y: { title: { display: true, text: 'Views' } },
+      likes: { position: 'right', title: { display: true, text: 'Likes' }, grid: { drawOnChartArea: false } },
+    },
+  });
+  barChart('engagement_rate_plot', series, [
+    { type: 'bar', label: 'Engagement Rate', data: series.engagement_rate, backgroundColor: BAR_COLORS },
+  ], {
+    plugins: { legend: { display: false } },
+    scales: { y: { title: { display: true, text: 'Engagement Rate (%)' }, ticks: { callback: (value) => `${(value * 100).toFixed(2)}%` } } },
+  });
+  barChart('composite_score_plot', series, [
+    { type: 'bar', label: 'Composite Score', data: series.composite_score, backgroundColor: BAR_COLORS },
+  ], {
+    plugins: { legend: { display: false } },
+    scales: { y: { title: { display: true, text: 'Composite Score' } } },
+  });
+}
+
+function drawSentiment(series) {
+  const canvas = chartCanvas('senti_plot');
+  if (!canvas) return;
+  new Chart(canvas, {
+    type: 'bar',
+    data: {
+      labels: series.index,
+      datasets: SENTIMENT_LABELS.map((label, i) => ({ label, data: series[label], backgroundColor: SENTIMENT_COLORS[i] })),
+    },
+    options: {
+      scales: {
+        x: { stacked: true, title: { display: true, text: 'Video Index' } },
+        y: { stacked: true, title: { display: true, text: 'Number of Comments' } },
+      },
+    },
+  });
+}
+
+function showError(message) {
+  const container = document.querySelector('.container');
+  const alertDiv = document.createElement('div');
+  alertDiv.className = 'alert alert-danger mt-3';
+  alertDiv.role = 'alert';
+  alertDiv.textContent = message;
+  container.appendChild(alertDiv);
+}
+
+function appendRow(tbody, record) {
+  const tr = document.createElement('tr');
+  const th = document.createElement('th');
+  th.textContent = record.index;
+  tr.appendChild(th);
+  for (const column of TABLE_COLUMNS) {
+    const td = document.createElement('td');
+    if (column === 'Title') {
+      const link = document.createElement('a');
+      link.href = record.Video_link;
+      link.target = '_blank';
+      link.textContent = record.Title;
+      td.appendChild(link);
+    } else if (column === 'Likes(%)') {
+      td.textContent = record[column] === null ? 'NaN' : record[column].toFixed(6);
+    } else {
+      td.textContent = record[column];
+    }
+    tr.appendChild(td);
+  }
+  tbody.appendChild(tr);
+}
+
+function streamResults(streamUrl) {
+  const container = document.querySelector('.container');
+  const tbody = document.querySelector('#results-table tbody');
+  const loading = document.getElementById('results-loading');
+  const source = new EventSource(CLIENT_CHARTS ? `${streamUrl}&format=data` : streamUrl);
+  const finish = () => {
+    source.close();
+    if (loading) loading.remove();
+  };
+
+  source.addEventListener('row', (event) => {
+    if (loading) loading.textContent = 'Loading visualizations...';
+    appendRow(tbody, JSON.parse(event.data));
+  });
+  source.addEventListener('token', (event) => {
+    container.dataset.token = JSON.parse(event.data).token;
+  });
+  source.addEventListener('chart', (event) => {
+    const data = JSON.parse(event.data);
+    if (data.error) {
+      console.error(`Error rendering ${data.name}:`, data.error);
+    } else if (data.name === 'videos') {
+      drawVideoCharts(data.data);
+    } else if (data.name === 'sentiment') {
+      drawSentiment(data.data);
+    } else {
+      showImage(data.name, data.image);
+    }
+  });
+  source.addEventListener('done', finish);
+  source.addEventListener('failure', (event) => {
+    finish();
+    showError(JSON.parse(event.data).error);
+  });
+  source.onerror = () => {
+    // Closing stops EventSource from reconnecting and re-running the whole search.
+    finish();
+    showError('The connection to the server was lost while loading results.');
+  };
+}
+
 async function fetchVisualizations() {
-    try {
-      const response = await fetch('/fetch_visualizations');
-      const data = await response.json();
-      
-      if (!data.error && data) {
-        const totalPlaceholder = document.getElementById("total-placeholder");
-        const engagementPlaceholder = document.getElementById("engagement-rate-placeholder");
-        const compositePlaceholder = document.getElementById("composite-score-placeholder");
-        if (totalPlaceholder && data.total_plot) {
-          totalPlaceholder.src = `data:image/png;base64,${data.total_plot}`;
-          totalPlaceholder.style.opacity = 1;
-        }
-  
-        if (engagementPlaceholder && data.engagement_rate_plot) {
-          engagementPlaceholder.src = `data:image/png;base64,${data.engagement_rate_plot}`;
-          engagementPlaceholder.style.opacity = 1;
-        }
-  
-        if (compositePlaceholder && data.composite_score_plot) {
-          compositePlaceholder.src = `data:image/png;base64,${data.composite_score_plot}`;
-          compositePlaceholder.style.opacity = 1;
-        }
-      } else {
-        console.error("Error in visualization response:", data.error || "No data available");
-      }
-      const response_senti = await fetch('/sentiment_analysis');
-      const data_senti = await response_senti.json();
-
-      if (!data_senti.error && data_senti) {
-        const sentimentPlaceholder = document.getElementById("sentiment-placeholder");
-        if (sentimentPlaceholder && data_senti.senti_plot) {
-          sentimentPlaceholder.src = `data:image/png;base64,${data_senti.senti_plot}`;
-          sentimentPlaceholder.style.opacity = 1;
-        }
-      } else {
-        console.error("Error in sentiment analysis response:", data_senti.error || "No sentiment data available");
-      }
-    } catch (error) {
-      console.error("Error fetching visualizations:", error);
-  
-      // Show an error alert on the page
-      const container = document.querySelector('.container');
-      const alertDiv = document.createElement('div');
-      alertDiv.className = 'alert alert-danger mt-3';
-      alertDiv.role = 'alert';
-      alertDiv.textContent = `An error occurred while loading visualizations: ${error.message}`;
-      container.appendChild(alertDiv);
+  try {
+    const token = encodeURIComponent(document.querySelector('.container').dataset.token || '');
+    const format = CLIENT_CHARTS ? '&format=data' : '';
+    const response = await fetch(`/fetch_visualizations?token=${token}${format}`);
+    const data = await response.json();
+
+    if (!data.error && data.data) {
+      drawVideoCharts(data.data);
+    } else if (!data.error && data) {
+      showImage('total_plot', data.total_plot);
+      showImage('engagement_rate_plot', data.engagement_rate_plot);
+      showImage('composite_score_plot', data.composite_score_plot);
+    } else {
+      console.error("Error in visualization response:", data.error || "No data available");
     }
+    const response_senti = await fetch(`/sentiment_analysis?token=${token}${format}`);
+    const data_senti = await response_senti.json();
+
+    if (!data_senti.error && data_senti.data) {
+      drawSentiment(data_senti.data);
+    } else if (!data_senti.error && data_senti) {
+      showImage('senti_plot', data_senti.senti_plot);
+    } else {
+      console.error("Error in sentiment analysis response:", data_senti.error || "No sentiment data available");
+    }
+  } catch (error) {
+    console.error("Error fetching visualizations:", error);
+
+    // Show an error alert on the page
+    showError(`An error occurred while loading visualizations: ${error.message}`);
+  }
+}
+
+window.onload = () => {
+  const container = document.querySelector('.container');
+  if (container.dataset.streamUrl && window.EventSource) {
+    streamResults(container.dataset.streamUrl);
+  } else if (container.dataset.token) {
+    fetchVisualizations();
   }
-  window.onload = fetchVisualizations;
\ No newline at end of file
+};
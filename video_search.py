@@ -1,70 +1,71 @@
-from youtube_search import fetch_video_details, fetch_comments_data, fetch_channel_details
-import pandas as pd  
-import isodate
-import base64
-import io
-from wordcloud import WordCloud
+from youtube_search import fetch_videos_details, fetch_channels_details, fetch_comment_threads, fetch_new_comments, comment_text
+from comment_index import comment_watermark, needs_refresh, record_comments, top_terms, COMMENT_INDEX_MAX_NEW
+from fanout import run_bounded
+from renderer import render
+from normalize import normalize_videos, link_titles
+from metrics import timed
+import os
 
-async def process_video(video_id):
-    video = await fetch_video_details(video_id)
-    
-    com_cnt = int(video['statistics']['commentCount']) if 'commentCount' in video['statistics'] else 0
-    com_data_rel, com_data_time = None, None
-    if com_cnt > 40:
-        com_data_rel = await fetch_comments_data(video_id, 20, "relevance")
-        com_data_time = await fetch_comments_data(video_id, 20, "time")
-    elif com_cnt > 20:
-        com_data_rel = await fetch_comments_data(video_id, 20, "relevance")
-        remaining_comments = com_cnt - 20
-        com_data_time = await fetch_comments_data(video_id, remaining_comments, "time")
-    else:
-        com_data_rel = await fetch_comments_data(video_id, com_cnt, "relevance")
+VIDEO_COMMENTS_PER_ORDER = int(os.getenv('VIDEO_COMMENTS_PER_ORDER', 20))
+WORDCLOUD_WIDTH = int(os.getenv('WORDCLOUD_WIDTH', 800))
+WORDCLOUD_HEIGHT = int(os.getenv('WORDCLOUD_HEIGHT', 400))
+WORDCLOUD_MAX_WORDS = int(os.getenv('WORDCLOUD_MAX_WORDS', 200))
+WORDCLOUD_PREVIEW_WORDS = int(os.getenv('WORDCLOUD_PREVIEW_WORDS', 50))
+WORDCLOUD_LAYOUT_SCALE = int(os.getenv('WORDCLOUD_LAYOUT_SCALE', 2))
+WORDCLOUD_FORMAT = os.getenv('WORDCLOUD_FORMAT', 'webp')
+WORDCLOUD_MAX_AGE = int(os.getenv('WORDCLOUD_MAX_AGE', 3600))
+
+# size name -> (canvas divisor, word limit); the preview is half the width and height.
+WORDCLOUD_SIZES = {'full': (1, WORDCLOUD_MAX_WORDS), 'preview': (2, WORDCLOUD_PREVIEW_WORDS)}
 
-    comments_rel = [item["snippet"]["topLevelComment"]["snippet"]["textOriginal"] for item in com_data_rel["items"]] if com_data_rel else None
-    comments_time = [item["snippet"]["topLevelComment"]["snippet"]["textOriginal"] for item in com_data_time["items"]] if com_data_time else None
+def comment_budget(video, max_comments):
+    # Relevance-ordered comments first, then up to as many of the remaining ones by time.
+    com_cnt = int(video.get('statistics', {}).get('commentCount', 0))
+    rel_count = min(com_cnt, max_comments)
+    return rel_count, min(com_cnt - rel_count, max_comments)
 
-    video_id = video["id"]
-    snippet = video["snippet"]
-    statistics = video.get("statistics", {})
-    content_details = video.get("contentDetails", {})
-    channel_title = snippet["channelTitle"]
-    channel_details = await fetch_channel_details(snippet["channelId"])
-    video_link = f"https://www.youtube.com/watch?v={video_id}"
-    
-    duration_str = content_details.get('duration', 'PT0S')
-    duration = isodate.parse_duration(duration_str)
-    total_seconds = int(duration.total_seconds())
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    seconds = total_seconds % 60
-    formatted_duration = f"{hours:02}:{minutes:02}:{seconds:02}"
-    video_info = {
-        "Title": snippet["title"],
-        "Views": int(statistics.get("viewCount", 0)),
-        "Likes": int(statistics.get("likeCount", 0)),
-        "Comments": int(statistics.get("commentCount", 0)),
-        "Upload_date": snippet.get("publishedAt", "N/A"),
-        "Duration": formatted_duration,
-        "Channel": channel_title,
-        "Subscribers": int(channel_details.get("subscriberCount", 0)),
-        'Video_link': video_link
-    }
-    df = pd.DataFrame([video_info])
-    try:
-        df['Upload_date'] = pd.to_datetime(df['Upload_date'].str.split('T').str[0])
-        df['Likes(%)'] = (df['Likes']) / (df['Views']) * 100
-        df = df[['Title', 'Channel', 'Subscribers', 'Views', 'Likes', 'Likes(%)', 'Duration', 'Upload_date', 'Comments', 'Video_link']]
-        df['Title'] = df.apply(lambda row: f'<a href="{row["Video_link"]}" target="_blank">{row["Title"]}</a>', axis=1)
-        return df, comments_rel, comments_time
-    except Exception as e:
-        print(f"An error occurred while processing the data: {e}")
+async def process_video(video_id, max_comments=VIDEO_COMMENTS_PER_ORDER):
+    # Relevance comments are fetched as before. Time-ordered comments only go back to the newest one
+    # already in the comment index, so a refresh fetches, tokenizes and scores just the new comments.
+    with timed('pipeline_stage_seconds', stage='details'):
+        videos = await fetch_videos_details([video_id])
+    video = videos.get(video_id)
+    if video is None:
         return None
-    
-async def generate_wordcloud(comments):
-    text = " ".join(comments)
-    wordcloud = WordCloud(width=800, height=400, background_color='white').generate(text)
-    img = io.BytesIO()
-    wordcloud.to_image().save(img, format='PNG')
-    img.seek(0)
-    img_base64 = base64.b64encode(img.getvalue()).decode('utf8')
-    return img_base64
\ No newline at end of file
+
+    rel_count, time_count = comment_budget(video, max_comments)
+    channel_id = video["snippet"]["channelId"]
+    since, refreshed_at, backfill = await comment_watermark(video_id)
+    page_token = None
+    if since is None and not refreshed_at:
+        new_count = time_count
+    elif needs_refresh(refreshed_at):
+        new_count = COMMENT_INDEX_MAX_NEW
+        # A gap left by a capped walk is filled before newer comments are looked at again.
+        page_token = backfill[0] if backfill else None
+    else:
+        new_count = 0
+    tasks = [fetch_channels_details([channel_id]), fetch_comment_threads(video_id, rel_count, "relevance")]
+    if new_count > 0:
+        tasks.append(fetch_new_comments(video_id, since, new_count, page_token))
+    with timed('pipeline_stage_seconds', stage='comments'):
+        channels, rel_items, *rest = await run_bounded(tasks)
+    # A failed walk comes back as None, which leaves the watermark and refresh time alone so the next visit retries.
+    time_items, resume_token = rest[0] if rest and rest[0] is not None else (None, None)
+    tracked = await record_comments(video_id, rel_items, time_items, resume_token, backfill if page_token else None)
+    comments_rel = [comment_text(item) for item in rel_items or []] or None
+    with timed('pipeline_stage_seconds', stage='normalize'):
+        df = link_titles(normalize_videos([video], channels or {}))
+    return df, comments_rel, tracked
+
+async def wordcloud_job(video_id, size='full', image_format='png'):
+    # Render arguments for the video's word cloud, or None while no terms are indexed for it.
+    # They double as the cache key, so the route can answer If-None-Match without rendering.
+    divisor, max_words = WORDCLOUD_SIZES[size]
+    frequencies = await top_terms(video_id, max_words)
+    if not frequencies:
+        return None
+    return frequencies, WORDCLOUD_WIDTH // divisor, WORDCLOUD_HEIGHT // divisor, WORDCLOUD_LAYOUT_SCALE, image_format
+
+async def generate_wordcloud(job):
+    return await render('render_wordcloud', *job)
@@ -1,262 +1,253 @@
+from http_client import get_session
+from fanout import run_bounded
+from cache import cache_get, cache_set, cache_get_many, cache_set_many, make_key
+from singleflight import single_flight
+from quota import acquire_key, mark_exhausted, error_reason, is_retryable, backoff_delay, QUOTA_REASONS, YOUTUBE_MAX_RETRIES
+from renderer import render
+from normalize import normalize_videos, link_titles
+from sentiment_client import SENTIMENT_LABELS
+from metrics import timed
 import aiohttp
-import matplotlib
-import pandas as pd
-from matplotlib.ticker import PercentFormatter, FuncFormatter
-import matplotlib.pyplot as plt
-from collections import Counter
-import seaborn as sns   
-import isodate
-import base64
-import io
+import asyncio
 import os
 
-matplotlib.use('Agg')
-sns.set()
-
-API_KEY_COMMENTS = os.getenv('YOUTUBE_COM_API_KEY')
-API_KEY_VIDEO = os.getenv('YOUTUBE_VID_API_KEY')
-BASE_URL = "https://www.googleapis.com/youtube/v3"
-API_URL = os.getenv('MODEL_API_URL')
-
-async def get_sentiments(comments):
-    async with aiohttp.ClientSession() as session:
+BASE_URL = os.getenv("YOUTUBE_API_BASE_URL", "https://www.googleapis.com/youtube/v3")
+# Pagination follows nextPageToken up to whatever total is asked for, so user-supplied totals are capped here.
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 50))
+COMMENTS_MAX_PER_VIDEO = int(os.getenv("COMMENTS_MAX_PER_VIDEO", 100))
+
+async def api_get(endpoint, params, cache=True):
+    if not cache:
+        return await _api_request(endpoint, params, cache=False)
+    cached = await cache_get(endpoint, params)
+    if cached is not None:
+        return cached
+    # Identical requests already in flight in this worker share one HTTP call.
+    return await single_flight(make_key(endpoint, params), lambda: _api_request(endpoint, params), shared=False)
+
+async def _api_request(endpoint, params, cache=True):
+    session = get_session()
+    for attempt in range(YOUTUBE_MAX_RETRIES + 1):
+        key = await acquire_key(endpoint)
         try:
-            payload = {"comments": comments}
-            async with session.post(API_URL, json=payload) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get("sentiments", [])
-                else:
-                    print(f"Error: Received {response.status} from API")
-                    return []
-        except Exception as e:
-            print(f"Error in get_sentiment_async: {e}")
-            return []
-
-
-async def analyze_comments(comments):
-    sentiment_labels = await get_sentiments(comments)
-    sentiment_counts = Counter(sentiment_labels)
-    result = {
-        'Positive': sentiment_counts.get('Positive', 0),
-        'Negative': sentiment_counts.get('Negative', 0),
-        'Neutral': sentiment_counts.get('Neutral', 0)
-    }
-    return result
-
-async def fetch_comments_data(video_id, max_results, order):
-    url = f"{BASE_URL}/commentThreads?part=snippet&videoId={video_id}&key={API_KEY_COMMENTS}&maxResults={max_results}&order={order}"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status == 200:
-                return await response.json()
-            return None
-
-async def fetch_video_data(search_query, max_results, sort_by='relevance'):
-    url = f"{BASE_URL}/search?part=snippet&type=video&q={search_query}&key={API_KEY_VIDEO}&maxResults={max_results}&order={sort_by}"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            response_body = await response.text()
+            with timed('youtube_request_seconds', endpoint=endpoint) as labels:
+                labels['status'] = 'error'
+                async with session.get(f"{BASE_URL}/{endpoint}", params=dict(params, key=key)) as response:
+                    labels['status'] = response.status
+                    if response.status == 200:
+                        data = await response.json()
+                    else:
+                        body = await response.text()
             if response.status == 200:
-                data = await response.json()
-                if 'items' in data and data['items']:
-                    return data
-                else:
-                    return None
-            else:
-                print(f"Failed to fetch video data. Status code: {response.status}")
-                print(f"Response body: {response_body}")
+                if cache:
+                    await cache_set(endpoint, params, data)
+                return data
+            reason = error_reason(body)
+            if response.status == 403 and reason in QUOTA_REASONS:
+                mark_exhausted(key)
+                continue
+            print(f"Failed to fetch {endpoint}. Status code: {response.status}")
+            print(f"Response body: {body}")
+            if not is_retryable(response.status, reason):
                 return None
-            
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error fetching {endpoint}: {e!r}")
+        if attempt < YOUTUBE_MAX_RETRIES:
+            await asyncio.sleep(backoff_delay(attempt))
+    return None
+
+MAX_PAGE_SIZE = {"search": 50, "commentThreads": 100}
+
+def cap_results(max_results):
+    return max(0, min(max_results, SEARCH_MAX_RESULTS))
+
+def cap_comments(max_comments):
+    return max(0, min(max_comments, COMMENTS_MAX_PER_VIDEO))
+
+class PageFetchFailed(Exception):
+    pass
+
+async def iter_page_batches(endpoint, params, total, cache=True):
+    # Yields (items, nextPageToken) a page at a time; the next page is requested while the caller
+    # consumes the current one. A page that cannot be fetched raises PageFetchFailed.
+    page_size = MAX_PAGE_SIZE[endpoint]
+    remaining = total
+    pending = None
+    if remaining > 0:
+        pending = asyncio.ensure_future(api_get(endpoint, dict(params, maxResults=min(page_size, remaining)), cache=cache))
+    try:
+        while pending is not None:
+            data = await pending
+            pending = None
+            if not data:
+                raise PageFetchFailed(f"Failed to fetch a page of {endpoint}")
+            items = data.get("items", [])[:remaining]
+            remaining -= len(items)
+            page_token = data.get("nextPageToken")
+            if remaining > 0 and items and page_token:
+                next_params = dict(params, maxResults=min(page_size, remaining), pageToken=page_token)
+                pending = asyncio.ensure_future(api_get(endpoint, next_params, cache=cache))
+            yield items, page_token
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+async def iter_pages(endpoint, params, total, cache=True):
+    # Yields items lazily; a page that fails ends the walk with whatever came before it.
+    pages = iter_page_batches(endpoint, params, total, cache=cache)
+    try:
+        async for items, _ in pages:
+            for item in items:
+                yield item
+    except PageFetchFailed:
+        return
+    finally:
+        await pages.aclose()
+
+def iter_search_items(search_query, total, sort_by='relevance'):
+    params = {"part": "snippet", "type": "video", "q": search_query, "order": sort_by}
+    return iter_pages("search", params, total)
+
+def iter_comment_threads(video_id, total, order='relevance', cache=True):
+    params = {"part": "snippet", "videoId": video_id, "order": order}
+    return iter_pages("commentThreads", params, total, cache=cache)
+
+def comment_text(item):
+    return item["snippet"]["topLevelComment"]["snippet"]["textOriginal"]
+
+async def fetch_comment_threads(video_id, total, order='relevance'):
+    return [item async for item in iter_comment_threads(video_id, total, order)]
+
+async def fetch_comments(video_id, total, order='relevance'):
+    comments = [comment_text(item) for item in await fetch_comment_threads(video_id, total, order)]
+    return comments or None
+
+async def fetch_new_comments(video_id, since, total, page_token=None):
+    # Newest first from page_token (or the newest comment), stopping at the first comment older than
+    # `since` (a publishedAt watermark). Returns (items, resume_token): resume_token is None once the walk
+    # reached `since` or the last page, otherwise the page to continue from after `total` ran out.
+    # Returns None if a page failed. The response cache is bypassed so new comments show up.
+    params = {"part": "snippet", "videoId": video_id, "order": "time"}
+    if page_token:
+        params["pageToken"] = page_token
+    items = []
+    resume_token = None
+    pages = iter_page_batches("commentThreads", params, total, cache=False)
+    try:
+        async for batch, resume_token in pages:
+            for item in batch:
+                if since and item["snippet"]["topLevelComment"]["snippet"].get("publishedAt", "") < since:
+                    return items, None
+                items.append(item)
+    except PageFetchFailed:
+        return None
+    finally:
+        # Closing here cancels the prefetched next page before it is sent.
+        await pages.aclose()
+    # Without a watermark there is nothing to reach: only the newest `total` comments are wanted.
+    return items, resume_token if since else None
+
+MAX_IDS_PER_CALL = 50
+
+def _id_chunks(ids, size=MAX_IDS_PER_CALL):
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+async def _fetch_items_by_id(endpoint, part, ids):
+    # Items are cached one ID at a time so different batches share entries.
+    ids = list(dict.fromkeys(i for i in ids if i))
+    cached = await cache_get_many(endpoint, [{"part": part, "id": i} for i in ids])
+    found = {i: item for i, item in zip(ids, cached) if item is not None}
+    missing = [i for i in ids if i not in found]
+    responses = await run_bounded([api_get(endpoint, {"part": part, "id": ",".join(chunk)}, cache=False)
+                                   for chunk in _id_chunks(missing)])
+    fetched = [item for data in responses if data for item in data.get("items", [])]
+    await cache_set_many(endpoint, [({"part": part, "id": item["id"]}, item) for item in fetched])
+    found.update((item["id"], item) for item in fetched)
+    return found
+
+async def fetch_videos_details(video_ids):
+    return await _fetch_items_by_id("videos", "snippet,statistics,contentDetails", video_ids)
+
+async def fetch_channels_details(channel_ids):
+    channels = await _fetch_items_by_id("channels", "statistics", channel_ids)
+    return {channel_id: item.get("statistics", {}) for channel_id, item in channels.items()}
+
 async def fetch_channel_details(channel_id):
-    url = f"{BASE_URL}/channels?part=statistics&id={channel_id}&key={API_KEY_VIDEO}"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status == 200:
-                result = await response.json()
-                if result["items"]:
-                    return result["items"][0]["statistics"]
-            return {}
+    channels = await fetch_channels_details([channel_id])
+    return channels.get(channel_id, {})
 
 async def fetch_video_details(video_id):
-    video_details_url = f"{BASE_URL}/videos?part=snippet,statistics,contentDetails&id={video_id}&key={API_KEY_VIDEO}"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(video_details_url) as response:
-            if response.status == 200:
-                result = await response.json()
-                if result["items"]:
-                    video_details = result["items"][0]
-                    return video_details
-            return None
-
-async def get_data(search_query, max_videos, sort_by, max_com, ord):
-    video_data = await fetch_video_data(search_query=search_query, max_results=max_videos, sort_by=sort_by)
-    detailed_video_data, comments_data = [], []
-    if video_data:
-        for video in video_data["items"]:
-            video_id = video["id"]["videoId"]
-            video_details = await fetch_video_details(video_id=video_id)
-            if video_details:
-                com_data = await fetch_comments_data(video_id=video_id, max_results=max_com, order=ord)
-                comments = [item["snippet"]["topLevelComment"]["snippet"]["textOriginal"] for item in com_data["items"]] if com_data else None
-            detailed_video_data.append(video_details)
-            comments_data.append(comments)
-        return detailed_video_data, comments_data
-    return None, None
+    videos = await fetch_videos_details([video_id])
+    return videos.get(video_id)
+
+async def fetch_all_comments(video_ids, max_com, ord):
+    with timed('pipeline_stage_seconds', stage='comments'):
+        return await run_bounded([fetch_comments(video_id, max_com, ord) for video_id in video_ids])
+
+async def _comments_for(comments_future, positions):
+    comments = await comments_future
+    return [comments[i] for i in positions]
+
+async def start_search(search_query, max_videos, sort_by, max_com, ord):
+    # The table is ready as soon as the batched details and channel lookups return;
+    # the comment fetches keep running and resolve through the returned future.
+    with timed('pipeline_stage_seconds', stage='search'):
+        video_ids = [video["id"]["videoId"] async for video in iter_search_items(search_query, max_videos, sort_by)]
+    if not video_ids:
+        return None, None
+    comments_future = asyncio.ensure_future(fetch_all_comments(video_ids, max_com, ord))
+    try:
+        with timed('pipeline_stage_seconds', stage='details'):
+            details = await fetch_videos_details(video_ids)
+            videos = [details.get(video_id) for video_id in video_ids]
+            channels = await fetch_channels_details([video["snippet"]["channelId"] for video in videos if video])
+    except BaseException:
+        comments_future.cancel()
+        raise
+    positions = [position for position, video in enumerate(videos) if video and "snippet" in video]
+    if not positions:
+        comments_future.cancel()
+        return None, None
+    with timed('pipeline_stage_seconds', stage='normalize'):
+        df = normalize_videos(videos, channels)
+    return df, asyncio.ensure_future(_comments_for(comments_future, positions))
 
 async def viz_combined(df, plot_type='total'):
-    if len(df) <= 20:
-        fig, ax = plt.subplots(figsize=(12, 8))
-        bottom_margin = 0.25 + 0.07 * (len(df) // 5)
-    elif len(df) <= 40:
-        fig, ax = plt.subplots(figsize=(14, 10))
-        bottom_margin = 0.17 + 0.05 * (len(df) // 5)
-    else:
-        fig, ax = plt.subplots(figsize=(18, 14))
-        bottom_margin = 0.1 + 0.05 * (len(df) // 5)
-        
-    colors = ['#03045e','#023e8a','#0077b6','#0096c7','#00b4d8','#48cae4','#90e0ef','#ade8f4']
-    sns.set_style('white')
-
-    if plot_type == 'total':
-        ax.bar(df.index + 1, df['Views'], color=colors)
-
-        if plot_type == 'total':
-            ax2 = ax.twinx()
-            ax2.plot(df.index + 1, df['Likes'], color='crimson', marker='D')
-            ax2.set_ylabel('Likes', fontsize=13, fontweight='bold')
-            ax2.yaxis.set_major_formatter(FuncFormatter(lambda x, _: f'{int(x):,}'))
-        else:
-            raise ValueError("Invalid plot_type. Use 'total' or 'percent'.")
-
-        ax.set_ylabel('Views', fontsize=13, fontweight='bold')
-        plt.title('Views and Likes Graph' if plot_type == 'total' else 'Views and Likes Percentage by Views', fontsize=16, fontweight='bold')
-
-    elif plot_type == 'engagement_rate':
-        df['engagement_rate'] = (df['Likes'] + df['Comments']) / df['Views']
-        ax.bar(df.index + 1, df['engagement_rate'], color=colors)
-        ax.yaxis.set_major_formatter(PercentFormatter(xmax=1.0))
-        ax.set_ylim(0, df['engagement_rate'].max() * 1.1)
-        ax.set_ylabel('Engagement Rate (%)', fontsize=13, fontweight='bold')
-        plt.title('Engagement Rate by Video', fontsize=16, fontweight='bold')
-
-    elif plot_type == 'composite_score':
-        df['engagement_rate'] = (df['Likes'] + df['Comments']) / df['Views']
-        df['composite_score'] = (df['Views'] * 0.4) + (df['Likes'] * 0.2) + (df['Comments'] * 0.2) + (df['engagement_rate'] * 0.1) + (df['Subscribers'] * 0.1)
-        ax.bar(df.index + 1, df['composite_score'], color=colors)
-        ax.set_ylabel('Composite Score', fontsize=13, fontweight='bold')
-        plt.title('Composite Score by Video', fontsize=16, fontweight='bold')
-
-    else:
-        raise ValueError("Invalid plot_type. Use 'total', 'percent', 'engagement_rate', or 'composite_score'.")
-
-    while len(colors) < len(df):
-        colors.extend(colors)
-
-    handles = [plt.Line2D([0], [0], color=c, marker='o', label=f"{num}: {name}", markersize=10, linestyle='None') 
-               for num, name, c in zip(df.index + 1, df['Title'], colors)]
-
-    legend = ax.legend(handles=handles, title='Title Mapping', loc='upper center', bbox_to_anchor=(0.5, -0.15), ncol=2)
-    plt.setp(legend.get_title(), fontsize=13, fontweight='bold')
-
-    ax.set_xlabel('Title Number', fontsize=13, fontweight='bold')
-    ax.set_xticks(range(1, len(df) + 1))
-    ax.set_xticklabels(range(1, len(df) + 1))
-    if plot_type == 'total' or plot_type == 'percent' or plot_type == 'composite_score':
-        ax.yaxis.set_major_formatter(FuncFormatter(lambda x, _: f'{int(x):,}'))
-    else:
-        ax.yaxis.set_major_formatter(FuncFormatter(lambda x, _: f'{x:.2%}'))
-
-    plt.rcParams['font.family'] = 'DejaVu Sans'
-    if len(df) > 40:
-        plt.tight_layout()
-
-    fig.subplots_adjust(bottom=bottom_margin)
-    
-    for text in legend.get_texts():
-        text.set_fontsize(10)
-    legend.get_frame().set_linewidth(0.5)
-
-    img = io.BytesIO()
-    plt.savefig(img, format='png')
-    plt.close()
-    img.seek(0)
-    return base64.b64encode(img.getvalue()).decode('utf8')
+    return await render('render_combined', df, plot_type)
+
+async def sentiment_viz(sentiment_results, type='multiple'):
+    # One {Positive, Negative, Neutral} dict per video; the frame is only built here, for the renderer.
+    import pandas as pd
+    return await render('render_sentiment', pd.DataFrame(sentiment_results), type)
+
+def chart_series(df):
+    # The numbers behind render_combined, for drawing the charts in the browser instead of shipping PNGs.
+    views = df['Views'].astype('float64')
+    likes = df['Likes'].astype('int64')
+    comments = df['Comments'].astype('int64')
+    engagement_rate = ((likes + comments) / views.where(views > 0)).fillna(0.0)
+    composite_score = views * 0.4 + likes * 0.2 + comments * 0.2 + engagement_rate * 0.1 + df['Subscribers'] * 0.1
+    return {
+        'index': list(range(1, len(df) + 1)),
+        'titles': df['Title'].tolist(),
+        'views': df['Views'].tolist(),
+        'likes': likes.tolist(),
+        'engagement_rate': engagement_rate.round(6).tolist(),
+        'composite_score': composite_score.round(2).tolist(),
+    }
 
-async def sentiment_viz(df, type='multiple'):
-    if type == 'multiple':
-        # Stacked bar chart for multiple videos
-        ax = df.plot(kind='bar', stacked=True, figsize=(12, 6), color=['#28a745', '#dc3545', '#bfbfbf'])
-        plt.title('Sentiment Analysis for Multiple Videos')
-        plt.xlabel('Video Index')
-        plt.ylabel('Number of Comments')
-        plt.xticks(ticks=range(len(df)), labels=[i + 1 for i in range(len(df))], rotation=0)
-        plt.legend(['Positive', 'Negative', 'Neutral'])
-    elif type == 'single':
-        # Non-stacked bar chart for a single video (different bars for each sentiment)
-        series = df.iloc[0] 
-        ax = series.plot(kind='bar', figsize=(12, 6), color=['#28a745', '#dc3545', '#bfbfbf'])
-        plt.title('Sentiment Analysis for a Single Video')
-        plt.ylabel('Number of Comments')
-        plt.xticks(rotation=0)
-    plt.tight_layout()
-    img = io.BytesIO()
-    plt.savefig(img, format='png')
-    plt.close()
-    img.seek(0)
-    return base64.b64encode(img.getvalue()).decode('utf8')
+def sentiment_series(sentiment_results):
+    series = {'index': list(range(1, len(sentiment_results) + 1))}
+    series.update({label: [counts[label] for counts in sentiment_results] for label in SENTIMENT_LABELS})
+    return series
 
 async def search_youtube(query, sort_by='relevance', max_results=10, max_com=10, order='relevance'):
-    videos_data, comments_data = await get_data(search_query=query, 
-                                                max_videos=max_results, 
-                                                sort_by=sort_by,
-                                                max_com=max_com,
-                                                ord=order)
-    if not videos_data:
-        return None
-    structured_data = []
-    for video in videos_data:
-        try:
-            if video:
-                video_id = video["id"]
-                snippet = video["snippet"]
-                statistics = video.get("statistics", {})
-                content_details = video.get("contentDetails", {})
-                channel_title = snippet["channelTitle"]
-                channel_details = await fetch_channel_details(snippet["channelId"])
-                video_link = f"https://www.youtube.com/watch?v={video_id}"
-                
-                duration_str = content_details.get('duration', 'PT0S')
-                duration = isodate.parse_duration(duration_str)
-                total_seconds = int(duration.total_seconds())
-                hours = total_seconds // 3600
-                minutes = (total_seconds % 3600) // 60
-                seconds = total_seconds % 60
-                formatted_duration = f"{hours:02}:{minutes:02}:{seconds:02}"
-                video_info = {
-                    "Title": snippet["title"],
-                    "Views": int(statistics.get("viewCount", 0)),
-                    "Likes": int(statistics.get("likeCount", 0)),
-                    "Comments": int(statistics.get("commentCount", 0)),
-                    "Upload_date": snippet.get("publishedAt", "N/A"),
-                    "Duration": formatted_duration,
-                    "Channel": channel_title,
-                    "Subscribers": int(channel_details.get("subscriberCount", 0)),
-                    'Video_link': video_link
-                }
-                structured_data.append(video_info)
-        except Exception as e:
-            print(f"Error processing video data: {e}")
-            continue
-    if not structured_data:
-        return None
-    df = pd.DataFrame(structured_data)
-    try:
-        df['Upload_date'] = pd.to_datetime(df['Upload_date'].str.split('T').str[0])
-        df['Likes(%)'] = (df['Likes']) / (df['Views']) * 100
-        df = df[['Title', 'Channel', 'Subscribers', 'Views', 'Likes', 'Likes(%)', 'Duration', 'Upload_date', 'Comments', 'Video_link']]
-        df['Title'] = df.apply(lambda row: f'<a href="{row["Video_link"]}" target="_blank">{row["Title"]}</a>', axis=1)
-        return df, comments_data
-    except Exception as e:
-        print(f"An error occurred while processing the data: {e}")
+    df, comments_future = await start_search(search_query=query,
+                                               max_videos=max_results,
+                                               sort_by=sort_by,
+                                               max_com=max_com,
+                                               ord=order)
+    if df is None:
         return None
+    comments_data = await comments_future
+    return link_titles(df), comments_data